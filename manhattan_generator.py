@@ -18,12 +18,25 @@ from __future__ import division
 
 import os
 import sys
+import json
+import time
+import re
+import math
+import base64
+import string
 import logging
 import argparse
+import multiprocessing
+from collections import OrderedDict
 
 import numpy as np
 import pandas as pd
 
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
 
 __author__ = "Louis-Philippe Lemieux Perreault"
 __copyright__ = "Copyright 2014, Beaulieu-Saucier Pharmacogenomics Centre"
@@ -43,6 +56,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger("manhattan-generator")
 
+# The options of the worker processes (sent once, see init_worker)
+worker_args = None
+
+
+# The delay between two checks for modifications in watch mode (seconds)
+WATCH_INTERVAL = 1.0
+
+# The number of columns per pixel used to simplify the lines (thick
+# anti-aliased lines need a few columns per pixel to be rendered identically)
+LINE_COLUMNS_PER_PIXEL = 4
+
+# The size of the tiles of the tile pyramid (pixels)
+TILE_SIZE = 256
+
+# The resolution of the HTML output (pixels per inch)
+HTML_DPI = 100
+
+# The maximal space between two chromosomes, as a fraction of the mean width
+# of the chromosomes (and of the merged contigs)
+CHROM_SPACING_FRACTION = 0.25
+
+# The padding of the X axis of the per chromosome plots (fraction of the span)
+CHROM_X_PADDING = 0.01
+
+# The weight of the chromosome color at the start of the density color ramps
+DENSITY_RAMP_START = 0.25
+
+# The label of the bin of the merged (small) contigs
+UNPLACED_LABEL = "unplaced"
+
+# The number of bins (chromosomes and contigs) above which the overlapping
+# tick labels are removed
+THIN_TICKS_ABOVE = 50
+
+# The median of the chi-squared distribution with one degree of freedom
+CHI2_MEDIAN = 0.4549364231195724
+
+# The chromosomes of the reference genome builds (1 to 22, X, Y and MT)
+BUILD_CHROMOSOMES = tuple(range(1, 25)) + (26, )
+
+# The chromosome lengths of the reference genome builds (in bp)
+GENOME_BUILDS = {
+    "GRCh37": (
+        249250621, 243199373, 198022430, 191154276, 180915260, 171115067,
+        159138663, 146364022, 141213431, 135534747, 135006516, 133851895,
+        115169878, 107349540, 102531392, 90354753, 81195210, 78077248,
+        59128983, 63025520, 48129895, 51304566, 155270560, 59373566, 16569,
+    ),
+    "GRCh38": (
+        248956422, 242193529, 198295559, 190214555, 181538259, 170805979,
+        159345973, 145138636, 138394717, 133797422, 135086622, 133275309,
+        114364328, 107043718, 101991189, 90338345, 83257441, 80373285,
+        58617616, 64444167, 46709983, 50818468, 156040895, 57227415, 16569,
+    ),
+}
+
+# The columnar input formats (by extension)
+COLUMNAR_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+    ".feather": "ipc",
+}
+
 
 class DraggableAnnotation:
     """Creates draggable annotations for markers."""
@@ -118,364 +196,3234 @@ class DraggableAnnotation:
         # redraw just the current annotation
         axes.draw_artist(self.annot)
 
-        # blit just the redrawn area
-        canvas.blit(axes.bbox)
+        # blit just the redrawn area
+        canvas.blit(axes.bbox)
+
+    def on_release(self, event):
+        """On release we reset the press data."""
+        if DraggableAnnotation.lock is not self:
+            return
+
+        self.press = None
+        DraggableAnnotation.lock = None
+
+        # turn off the annot animation property and reset the background
+        self.annot.set_animated(False)
+        self.background = None
+
+        # redraw the full figure
+        self.annot.figure.canvas.draw()
+
+    def disconnect(self):
+        "Disconnect all the stored connection ids."""
+        self.annot.figure.canvas.mpl_disconnect(self.cidpress)
+        self.annot.figure.canvas.mpl_disconnect(self.cidrelease)
+        self.annot.figure.canvas.mpl_disconnect(self.cidmotion)
+
+
+class ProgramError(Exception):
+    """An :py:class:`Exception` raised in case of a problem.
+
+    :param msg: the message to print to the user before exiting.
+    :type msg: string
+
+    """
+    def __init__(self, msg):
+        """Construction of the :py:class:`ProgramError` class.
+
+        :param msg: the message to print to the user
+        :type msg: string
+
+        """
+        self.message = str(msg)
+
+    def __str__(self):
+        """Creates a string representation of the message."""
+        return self.message
+
+
+class FigureTemplate:
+    """A figure holding the static layers of a plot, cached by layout.
+
+    Plots sharing the same layout and presentation options (*e.g.* many
+    phenotypes on the same marker panel) reuse the same figure, with its
+    chromosome boxes, ticks, labels and axis styling. Only the layers
+    depending on the marker data are removed and drawn again. For Agg (PNG)
+    output, the static layers are also rendered once to a raster background
+    (without the Y axis, which depends on the confidence values), on which the
+    other layers are composited.
+
+    """
+    # The cached templates (by key)
+    cache = OrderedDict()
+
+    # The maximal number of cached templates
+    max_cached = 4
+
+    def __init__(self, figure, ax):
+        """Creates a template from a figure and its axe."""
+        self.key = None
+        self.figure = figure
+        self.ax = ax
+        self.layers = {}
+        self.background = None
+        self.owner = None
+
+    def register(self, key):
+        """(Re)registers the template in the cache, using a new key.
+
+        Args:
+            key (tuple): the key describing the static layers.
+
+        The raster background is discarded, since the static layers changed.
+
+        """
+        if FigureTemplate.cache.get(self.key) is self:
+            del FigureTemplate.cache[self.key]
+        self.key = key
+        self.background = None
+        FigureTemplate.cache[key] = self
+
+        # Too many templates
+        while len(FigureTemplate.cache) > FigureTemplate.max_cached:
+            _, template = FigureTemplate.cache.popitem(last=False)
+            if getattr(template.figure.canvas, "manager", None) is not None:
+                import matplotlib.pyplot as plt
+                plt.close(template.figure)
+
+    def release(self, static_layers):
+        """Removes the layers which are not static (from the last owner)."""
+        for name in list(self.layers.keys()):
+            if name not in static_layers:
+                for artist in self.layers.pop(name):
+                    artist.remove()
+
+
+class ContigNames:
+    """The codes and the plotting order of the chromosomes (and contigs).
+
+    Chromosomes are encoded as usual (see :py:func:`encode_known_chr`). Any
+    other name (*e.g.* the scaffolds of a non-model organism assembly) is a
+    contig, encoded by a negative integer (in order of appearance). All the
+    input files and options share the same codes.
+
+    The chromosomes are plotted in ``natural`` order (the chromosomes, then
+    the contigs sorted by name, comparing numbers numerically) or in
+    ``input`` order (the order of appearance, the names of an ordering file
+    being seen first).
+
+    """
+    def __init__(self, order="natural", names=None):
+        """Creates the codes (with the names of an ordering file, if any)."""
+        self.order = order
+        self.codes = {}
+        self.names = {}
+        self.ranks = {}
+        if names is not None:
+            for name in names:
+                self.encode_name(name)
+
+    def encode_name(self, chromosome, rank=True):
+        """Encodes a single chromosome (or contig).
+
+        Args:
+            chromosome (str): the name of the chromosome.
+            rank (bool): record the order of appearance of the chromosome?
+
+        Returns:
+            int: the code of the chromosome.
+
+        """
+        code = encode_known_chr(chromosome)
+        if code is None:
+            chromosome = str(chromosome)
+            code = self.codes.get(chromosome)
+            if code is None:
+                code = -1 - len(self.codes)
+                self.codes[chromosome] = code
+                self.names[code] = chromosome
+        if rank and code not in self.ranks:
+            self.ranks[code] = len(self.ranks)
+        return code
+
+    def encode(self, chromosomes):
+        """Encodes many chromosomes (each distinct name only once).
+
+        Args:
+            chromosomes (numpy.ndarray): the chromosomes to encode.
+
+        Returns:
+            numpy.ndarray: the codes of the chromosomes.
+
+        """
+        codes, uniques = pd.factorize(chromosomes)
+        encoded = np.array([self.encode_name(chrom) for chrom in uniques],
+                           dtype=np.int64)
+        return encoded[codes]
+
+    def label(self, code):
+        """Returns the label of a chromosome (its name, for a contig)."""
+        return self.names.get(code, str(code))
+
+    def full_label(self, code):
+        """Returns the label of a chromosome (with the ``chr`` prefix)."""
+        if self.is_contig(code):
+            return self.names[code]
+        return "chr{}".format(code)
+
+    def is_contig(self, code):
+        """Is the code the one of a contig?"""
+        return code < 0
+
+    def sort(self, codes):
+        """Returns the codes in plotting order."""
+        if self.order == "natural":
+            return sorted(codes, key=lambda code: (
+                (1, 0, natural_key(self.names[code])) if self.is_contig(code)
+                else (0, code, [])
+            ))
+        return sorted(codes, key=lambda code: (
+            self.ranks.get(code, len(self.ranks)), code,
+        ))
+
+
+class QuantileSketch:
+    """A mergeable sketch of the quantiles of the -log10(p) values.
+
+    The values are counted in a fixed histogram (bins of ``resolution``, up to
+    ``max_value``), so that the memory stays bounded whatever the number of
+    markers, and that two sketches (*e.g.* of two chunks of the input file)
+    are merged by adding their counts. The quantiles are exact up to half a
+    bin (*i.e.* a relative error of about 0.1% on the p values).
+
+    The ``nb_top`` largest values (the most significant markers, in the tail
+    of the QQ plot) are also kept exactly.
+
+    """
+    # The width of a bin (in -log10(p))
+    resolution = 0.001
+
+    # The maximal value (smaller p values are counted in the last bin)
+    max_value = 330.0
+
+    # The number of largest values kept exactly
+    nb_top = 1000
+
+    def __init__(self, values=None):
+        """Creates the sketch (optionally from an array of values)."""
+        nb_bins = int(round(self.max_value / self.resolution)) + 1
+        self.counts = np.zeros(nb_bins, dtype=np.int64)
+        self.top = np.zeros(0)
+        if values is not None:
+            self.update(values)
+
+    def get_bins(self, values):
+        """Returns the bin of each value."""
+        bins = np.floor(values / self.resolution)
+        return np.clip(bins, 0, len(self.counts) - 1).astype(np.int64)
+
+    def update_top(self, values):
+        """Keeps the largest values (sorted in decreasing order)."""
+        values = np.concatenate((self.top, values))
+        if len(values) > self.nb_top:
+            values = np.partition(values, -self.nb_top)[-self.nb_top:]
+        self.top = np.sort(values)[::-1]
+
+    def update(self, values):
+        """Adds -log10(p) values to the sketch (missing values are ignored)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.counts += np.bincount(self.get_bins(values),
+                                   minlength=len(self.counts))
+        self.update_top(values)
+
+    def merge(self, other):
+        """Merges another sketch into this one (and returns it)."""
+        self.counts += other.counts
+        self.update_top(other.top)
+        return self
+
+    @property
+    def count(self):
+        """The number of values in the sketch."""
+        return int(self.counts.sum())
+
+    def check_count(self):
+        """Checks that the sketch is not empty.
+
+        Note
+        ----
+
+            If there is no value in the sketch (*e.g.* if all the markers are
+            excluded), a :py:class:`ProgramError` is raised.
+
+        """
+        if self.count == 0:
+            raise ProgramError("no p value for the QQ plot")
+
+    def quantile(self, q):
+        """Returns the value at quantile q (interpolated in its bin)."""
+        self.check_count()
+        target = q * self.count
+        cum_counts = np.cumsum(self.counts)
+        i = int(np.searchsorted(cum_counts, target))
+        before = cum_counts[i] - self.counts[i]
+        return (i + (target - before) / self.counts[i]) * self.resolution
+
+    def qq_points(self):
+        """Returns the expected and the observed -log10(p) values.
+
+        Returns:
+            tuple: the expected and the observed values (one point per
+                   largest value, then two points per non empty bin of the
+                   other values, for its first and last ranks).
+
+        The markers are ranked by decreasing observed value, and the expected
+        value of rank *i* (out of *n*) is :math:`-log_{10}(i / (n + 1))`. The
+        tail is exact, since the largest values are kept (the histogram is
+        only used for the bulk of the values).
+
+        """
+        self.check_count()
+        nb_values = self.count
+        nb_top = len(self.top)
+
+        # The other values (without the largest ones)
+        counts = self.counts - np.bincount(self.get_bins(self.top),
+                                           minlength=len(self.counts))
+        bins = np.flatnonzero(counts)[::-1]
+        counts = counts[bins]
+        last_rank = np.cumsum(counts) + nb_top
+        first_rank = last_rank - counts + 1
+
+        ranks = np.concatenate((np.arange(1, nb_top + 1), first_rank,
+                                last_rank))
+        observed = (bins + 0.5) * self.resolution
+        return (-np.log10(ranks / (nb_values + 1)),
+                np.concatenate((self.top, observed, observed)))
+
+    def genomic_inflation(self):
+        """Returns the genomic inflation factor (lambda GC).
+
+        The median p value is converted to its chi-squared statistic (one
+        degree of freedom), which is divided by the expected median.
+
+        """
+        median_p = 10 ** -self.quantile(0.5)
+        return chi2_isf(median_p) / CHI2_MEDIAN
+
+
+class GeneIndex:
+    """A per-chromosome sorted interval index of genes.
+
+    The genes are sorted by chromosome (labels, see
+    :py:meth:`ContigNames.label`) and start position, and the running
+    maximum of the end positions (with the gene reaching it) is kept for each
+    chromosome, so that the overlapping or nearest gene of many markers is
+    found using binary searches (see :py:meth:`nearest`). The index is cached
+    in a binary (``.npz``) file next to the annotation file.
+
+    """
+    # The arrays of the index (saved in the cache)
+    arrays = ("chromosomes", "bounds", "start", "end", "max_end",
+              "max_end_index", "names")
+
+    def __init__(self, chrom, start, end, names):
+        """Creates the index from the genes (sorted by chrom and start)."""
+        self.chromosomes, first = np.unique(chrom, return_index=True)
+        self.bounds = np.append(first, len(chrom))
+        self.start = start
+        self.end = end
+        self.names = names
+
+        # The running maximum of the end positions (for each chromosome)
+        self.max_end = np.empty_like(end)
+        self.max_end_index = np.empty(len(end), dtype=np.int64)
+        for lo, hi in zip(self.bounds[:-1], self.bounds[1:]):
+            max_end = np.maximum.accumulate(end[lo:hi])
+            index = np.where(end[lo:hi] == max_end, np.arange(lo, hi), lo)
+            self.max_end[lo:hi] = max_end
+            self.max_end_index[lo:hi] = np.maximum.accumulate(index)
+
+    @classmethod
+    def load(cls, fn):
+        """Loads the index of a gene annotation file (using the cache).
+
+        Args:
+            fn (str): the name of the annotation file (GTF or BED).
+
+        Returns:
+            GeneIndex: the index of the genes.
+
+        The cache (``<fn>.idx.npz``) is used if it is more recent than the
+        annotation file. Otherwise, the file is parsed and the cache is
+        written (if possible).
+
+        """
+        cache_fn = fn + ".idx.npz"
+        if os.path.isfile(cache_fn) and \
+                os.path.getmtime(cache_fn) >= os.path.getmtime(fn):
+            index = cls.__new__(cls)
+            with np.load(cache_fn, allow_pickle=False) as cache:
+                for name in cls.arrays:
+                    setattr(index, name, cache[name])
+            return index
+
+        logger.info("Indexing the genes of {}".format(fn))
+        index = cls.from_file(fn)
+        try:
+            with open(cache_fn, "wb") as o_file:
+                np.savez(o_file, **{name: getattr(index, name)
+                                    for name in cls.arrays})
+        except (IOError, OSError) as e:
+            logger.warning("{}: could not cache the index: {}".format(
+                cache_fn, e,
+            ))
+        return index
+
+    @classmethod
+    def from_file(cls, fn):
+        """Parses a gene annotation file (GTF or BED, possibly compressed).
+
+        Args:
+            fn (str): the name of the annotation file.
+
+        Returns:
+            GeneIndex: the index of the genes.
+
+        For GTF files, the ``gene`` features are used (with their
+        ``gene_name``, or ``gene_id`` attribute). For BED files, the fourth
+        column is the name of the gene. The genes are indexed by the label of
+        their chromosome (the name of the contig if it is not a known
+        chromosome).
+
+        """
+        try:
+            if ".gtf" in os.path.basename(fn).lower():
+                genes = pd.read_csv(fn, sep="\t", header=None, comment="#",
+                                    usecols=[0, 2, 3, 4, 8],
+                                    names=["chrom", "feature", "start", "end",
+                                           "attributes"],
+                                    dtype={"chrom": str}, low_memory=False)
+                genes = genes[genes.feature == "gene"]
+                attributes = genes.attributes.str
+                genes["name"] = attributes.extract(
+                    r'gene_name "([^"]+)"', expand=False,
+                ).fillna(attributes.extract(r'gene_id "([^"]+)"',
+                                            expand=False))
+
+            else:
+                genes = pd.read_csv(fn, sep="\t", header=None, comment="#",
+                                    usecols=[0, 1, 2, 3],
+                                    names=["chrom", "start", "end", "name"],
+                                    dtype={"chrom": str}, low_memory=False)
+                genes["start"] += 1
+
+        except (ValueError, pd.errors.ParserError) as e:
+            raise ProgramError("{}: invalid annotation file: {}".format(fn, e))
+
+        # The labels of the chromosomes
+        labels = {}
+        for name in genes.chrom.unique():
+            code = encode_known_chr(name)
+            labels[name] = name if code is None else str(code)
+        genes["chrom"] = genes.chrom.map(labels)
+        genes = genes.sort_values(by=["chrom", "start"])
+
+        return cls(genes.chrom.values.astype(str),
+                   genes.start.values.astype(np.int64),
+                   genes.end.values.astype(np.int64),
+                   genes.name.fillna("").values.astype(str))
+
+    def nearest(self, chrom, pos):
+        """Finds the overlapping (or nearest) gene of markers.
+
+        Args:
+            chrom (numpy.ndarray): the chromosomes (labels) of the markers.
+            pos (numpy.ndarray): the positions of the markers.
+
+        Returns:
+            tuple: the index of the genes (-1 if there is no gene on the
+                   chromosome) and the distances (0 for overlapping genes).
+
+        """
+        genes = np.full(len(pos), -1, dtype=np.int64)
+        distances = np.full(len(pos), np.inf)
+        for chromosome in np.unique(chrom):
+            i = np.searchsorted(self.chromosomes, chromosome)
+            if i == len(self.chromosomes) or \
+                    self.chromosomes[i] != chromosome:
+                continue
+            lo, hi = self.bounds[i], self.bounds[i + 1]
+            mask = chrom == chromosome
+            marker_pos = pos[mask]
+
+            # The last gene starting before (and the next one)
+            left = np.searchsorted(self.start[lo:hi], marker_pos,
+                                   side="right") - 1 + lo
+            right = np.minimum(left + 1, hi - 1)
+            left_c = np.maximum(left, lo)
+
+            # Of the genes starting before, the one ending the furthest
+            left_distance = np.where(
+                left >= lo,
+                np.maximum(marker_pos - self.max_end[left_c], 0),
+                np.inf,
+            )
+            right_distance = np.where(left + 1 < hi,
+                                      self.start[right] - marker_pos, np.inf)
+            use_right = right_distance < left_distance
+            genes[mask] = np.where(use_right, right,
+                                   self.max_end_index[left_c])
+            distances[mask] = np.minimum(left_distance, right_distance)
+
+        return genes, distances
+
+    def labels(self, chrom, pos):
+        """Returns the gene labels of markers (with the distance, if any)."""
+        genes, distances = self.nearest(chrom, pos)
+        labels = []
+        for gene, distance in zip(genes, distances):
+            if gene < 0:
+                labels.append("")
+            elif distance == 0:
+                labels.append(self.names[gene])
+            else:
+                labels.append("{} ({:.1f} kb)".format(self.names[gene],
+                                                      distance / 1000))
+        return labels
+
+
+class ManhattanPlot:
+    """Holds the processed marker data, the layout and the layers of a plot.
+
+    Each layer of the plot (the chromosome boxes, the points, the ablines,
+    etc.) is drawn by its own method, so that a single layer can be removed
+    and drawn again (*e.g.* in watch mode, when only a few options changed)
+    without re-reading or re-sorting the data. The static layers are kept in
+    a :py:class:`FigureTemplate`.
+
+    """
+    # The options requiring the input files to be read again
+    input_options = ("twopoint", "multipoint", "col_chr", "col_name",
+                     "col_pos", "col_cm", "col_pvalue", "col_lod",
+                     "phys_pos_flag", "use_pvalues_flag", "exclude_chr",
+                     "min_conf", "genome_build", "chr_order", "unplaced_below")
+
+    # The options modifying the limits of the Y axis
+    limit_options = ("max_ylim", "min_ylim", "no_negative_values",
+                     "no_y_padding")
+
+    # The layers (in drawing order) with the options they depend on
+    layer_options = OrderedDict([
+        ("frame", ("graph_title", "graph_x_label", "graph_y_label",
+                   "graph_width", "graph_height", "axis_text_size",
+                   "chr_text_size", "label_text_size")),
+        ("boxes", ("chromosome_box_color", )),
+        ("twopoint", ("point_size", "even_chromosome_color",
+                      "odd_chromosome_color", "point_renderer",
+                      "decimate_points", "graph_width", "graph_height",
+                      "dpi") + limit_options),
+        ("multipoint", ("multipoint_color", "even_chromosome_color",
+                        "odd_chromosome_color", "graph_width", "dpi")),
+        ("ablines", ("abline", ) + limit_options),
+        ("significant", ("significant_threshold", "significant_point_size",
+                         "significant_color", "no_annotation", "genes") +
+                        limit_options),
+    ])
+
+    # The layers which don't depend on the marker values (kept in the figure
+    # template and rendered in the raster background)
+    static_layers = ("frame", "boxes")
+
+    def __init__(self, twopoint, multipoint, args, layout=None):
+        """Creates the plot from the two point and multipoint data."""
+        self.args = args
+        self.figure = None
+        self.ax = None
+        self.save_only = False
+        self.template = None
+        self.layers = {}
+        self.annots = []
+        self.set_data(twopoint, multipoint, layout)
+
+    def set_data(self, twopoint, multipoint, layout=None):
+        """Sets the marker data and computes everything depending on it.
+
+        Args:
+            twopoint (pandas.DataFrame): the two point data
+                                         (``None`` if not available).
+            multipoint (pandas.DataFrame): the multipoint data
+                                           (``None`` if not available).
+            layout (pandas.DataFrame): the layout of the chromosomes (``None``
+                                       to compute it from the data).
+
+        """
+        self.twopoint = twopoint
+        self.multipoint = multipoint
+
+        # The (maximal) chromosome spacing
+        self.chrom_spacing = 25.0
+        if self.args.phys_pos_flag:
+            self.chrom_spacing = 25000000
+
+        # The layout of the chromosomes, and the cumulative positions (the
+        # markers are sorted by cumulative position if the plotting order is
+        # not the order of the codes)
+        if layout is None:
+            layout = compute_chrom_layout(
+                twopoint, multipoint, self.chrom_spacing,
+                self.args.chrom_lengths, self.args.contigs,
+                self.args.unplaced_below,
+            )
+        self.layout = layout
+        self.chrom_spacing = float(layout.spacing.iloc[0])
+        for data in (twopoint, multipoint):
+            if data is not None:
+                data["cum_pos"] = data.pos + data.chrom.map(self.layout.start)
+        if twopoint is not None and \
+                not twopoint.cum_pos.is_monotonic_increasing:
+            self.twopoint = twopoint.sort_values(by="cum_pos",
+                                                 kind="mergesort")
+        if multipoint is not None and \
+                not multipoint.cum_pos.is_monotonic_increasing:
+            self.multipoint = multipoint.sort_values(by="cum_pos",
+                                                     kind="mergesort")
+
+        # The limits of the X axis
+        self.xlim = (0 - self.chrom_spacing,
+                     self.layout.xmax.iloc[-1] + self.chrom_spacing * 1.5)
+
+        self.compute_limits()
+        self.compute_significance()
+
+    def compute_limits(self):
+        """Computes the minimum and maximum of the confidence value."""
+        args = self.args
+        conf_min = [0.0]
+        conf_max = []
+        for data in (self.twopoint, self.multipoint):
+            if data is not None:
+                conf_min.append(data.conf.min())
+                conf_max.append(data.conf.max())
+        conf_min = min(conf_min)
+        conf_max = max(conf_max)
+        if args.max_ylim is not None:
+            conf_max = args.max_ylim
+        if args.min_ylim is not None:
+            conf_min = args.min_ylim
+        if args.no_negative_values or args.use_pvalues_flag:
+            conf_min = 0.0
+        self.conf_min = conf_min
+        self.conf_max = conf_max
+
+    def compute_significance(self):
+        """Computes the significance mask of the two point markers.
+
+        The nearest gene of each significant marker is also found, if there
+        is a gene index.
+
+        """
+        self.sig_mask = None
+        self.sig_genes = None
+        if self.twopoint is not None:
+            self.sig_mask = (self.twopoint.conf.values >=
+                             self.args.significant_threshold)
+            if self.args.gene_index is not None:
+                significant = self.twopoint[self.sig_mask]
+                self.sig_genes = self.args.gene_index.labels(
+                    np.array([self.args.contigs.label(chrom)
+                              for chrom in significant.chrom], dtype=str),
+                    significant.pos.values,
+                )
+
+    def changed_options(self, args, names):
+        """Returns the options (from names) that differ from the current."""
+        return [name for name in names
+                if getattr(args, name) != getattr(self.args, name)]
+
+    def get_layer_options(self, name, args):
+        """Returns the options a layer depends on.
+
+        Args:
+            name (str): the name of the layer.
+            args (argparse.Namespace): the (new) options.
+
+        Returns:
+            tuple: the names of the options.
+
+        The density of the two point markers leaves the significant markers
+        out, so it also depends on the significant threshold.
+
+        """
+        options = self.layer_options[name]
+        if name == "twopoint" and args.point_renderer == "density":
+            options += ("significant_threshold", )
+        return options
+
+    def update_args(self, args):
+        """Updates the options and returns the layers to draw again.
+
+        Args:
+            args (argparse.Namespace): the new options.
+
+        Returns:
+            list: the names of the layers which need to be drawn again.
+
+        """
+        layers = [name for name in self.layer_options.keys()
+                  if self.changed_options(args,
+                                          self.get_layer_options(name, args))]
+        limits_changed = self.changed_options(args, self.limit_options)
+        threshold_changed = self.changed_options(
+            args, ("significant_threshold", "genes"),
+        )
+        self.args = args
+
+        if limits_changed:
+            self.compute_limits()
+        if threshold_changed:
+            self.compute_significance()
+
+        return layers
+
+    def template_key(self):
+        """Returns the key describing the static layers of the plot.
+
+        The limits of the Y axis are not part of the key, since the Y axis is
+        drawn over the background (see :py:meth:`save_composited`), so that
+        plots with different confidence values share the same template.
+
+        """
+        options = ["use_pvalues_flag", "dpi"]
+        for name in self.static_layers:
+            options.extend(self.layer_options[name])
+        positions = self.layout[["start", "xmin", "xmax", "tick", "parity"]]
+        return (
+            tuple(self.layout.index), tuple(self.layout.label),
+            positions.values.tobytes(), self.chrom_spacing, self.xlim,
+            self.save_only,
+        ) + tuple(repr(getattr(self.args, name)) for name in options)
+
+    def create_figure(self, plt):
+        """Creates the figure and the axe (or reuses a cached template).
+
+        Args:
+            plt (module): the :py:mod:`matplotlib.pyplot` module (``None`` if
+                          the figure is only saved, see
+                          :py:func:`new_figure`).
+
+        """
+        self.save_only = plt is None
+        key = self.template_key()
+        template = FigureTemplate.cache.get(key)
+        if template is None:
+            figure = new_figure(plt, (self.args.graph_width,
+                                      self.args.graph_height))
+            template = FigureTemplate(figure, figure.add_subplot(111))
+            template.register(key)
+        else:
+            template.release(self.static_layers)
+
+        template.owner = self
+        self.template = template
+        self.figure = template.figure
+        self.ax = template.ax
+        self.layers = template.layers
+
+    def draw(self, layers=None):
+        """Draws the layers of the plot.
+
+        Args:
+            layers (list): the layers to draw (``None`` to draw all the layers
+                           which are not already drawn).
+
+        Layers which were previously drawn are removed before being drawn
+        again.
+
+        """
+        if layers is None:
+            layers = [name for name in self.layer_options.keys()
+                      if name not in self.layers]
+
+        for name in self.layer_options.keys():
+            if name not in layers:
+                continue
+            for artist in self.layers.pop(name, []):
+                artist.remove()
+            self.layers[name] = getattr(self, "draw_" + name)()
+
+        self.set_limits()
+
+        # The static layers might have changed
+        key = self.template_key()
+        if key != self.template.key:
+            self.template.register(key)
+
+    def draw_frame(self):
+        """Draws the figure frame (axis, title, labels and ticks)."""
+        args = self.args
+        ax = self.ax
+        self.figure.set_size_inches(args.graph_width, args.graph_height)
+        ax.xaxis.set_ticks_position("none")
+        ax.yaxis.set_ticks_position("left")
+        ax.spines["top"].set_visible(False)
+        ax.spines["right"].set_visible(False)
+        ax.spines["bottom"].set_visible(False)
+        if args.use_pvalues_flag:
+            ax.set_ylabel(r'$-\log_{10}$ (p value)',
+                          fontsize=args.label_text_size)
+        else:
+            ax.set_ylabel(args.graph_y_label, fontsize=args.label_text_size)
+        ax.set_xlabel(args.graph_x_label, fontsize=args.label_text_size)
+        ax.set_title(args.graph_title, fontsize=16, weight="bold")
+
+        # Putting the xticklabels (only those which don't overlap)
+        bins = get_layout_bins(self.layout)
+        width = ax.get_position().width * args.graph_width * 72
+        kept = thin_ticks(bins.tick.values, bins.label.values, self.xlim,
+                          width, args.chr_text_size)
+        ax.set_xticks(bins.tick.values[kept])
+        ax.set_xticklabels(bins.label.values[kept])
+        ax.tick_params(axis="y", labelsize=args.axis_text_size)
+        ax.tick_params(axis="x", labelsize=args.chr_text_size)
+
+        return []
+
+    def draw_boxes(self):
+        """Draws the boxes surrounding every other chromosome.
+
+        All the boxes are drawn by a single collection (spanning the height of
+        the axe), whatever the number of chromosomes.
+
+        """
+        import matplotlib as mpl
+        bins = get_layout_bins(self.layout)
+        boxes = bins[bins.parity == 1]
+        color = self.args.chromosome_box_color
+        collection = mpl.collections.PolyCollection(
+            [[(xmin, 0), (xmin, 1), (xmax, 1), (xmax, 0)]
+             for xmin, xmax in zip(boxes.xmin, boxes.xmax)],
+            facecolors=color, edgecolors=color,
+            linewidths=mpl.rcParams["patch.linewidth"],
+            transform=self.ax.get_xaxis_transform(),
+        )
+        self.ax.add_collection(collection, autolim=False)
+        return [collection]
+
+    def get_colors(self):
+        """Returns the point color of each chromosome, depending on parity."""
+        return (self.args.odd_chromosome_color,
+                self.args.even_chromosome_color)
+
+    def draw_twopoint(self):
+        """Draws the two point markers (one artist per color)."""
+        if self.twopoint is None:
+            return []
+
+        if self.args.point_renderer == "numpy":
+            return self.draw_twopoint_image()
+        if self.args.point_renderer == "density":
+            return self.draw_twopoint_density()
+
+        parity = self.twopoint.chrom.map(self.layout.parity).values
+        artists = []
+        for i, color in enumerate(self.get_colors()):
+            data = self.twopoint[parity == i]
+            x = data.cum_pos.values
+            y = data.conf.values
+
+            # Only a single marker per pixel of the output is drawn
+            keep = slice(None)
+            if self.args.decimate_points:
+                width, height = self.get_axe_size()
+                keep = decimate_points(x, y, self.xlim, self.get_ylim(),
+                                       width, height)
+
+            artists.extend(self.ax.plot(
+                x[keep], y[keep], marker="o", ms=self.args.point_size,
+                mfc=color, mec=color, ls="None",
+            ))
+        return artists
+
+    def get_axe_size(self):
+        """Returns the width and height of the axe in the output (pixels)."""
+        position = self.ax.get_position()
+        return (
+            int(round(position.width * self.args.graph_width *
+                      self.args.dpi)),
+            int(round(position.height * self.args.graph_height *
+                      self.args.dpi)),
+        )
+
+    def draw_twopoint_image(self):
+        """Draws the two point markers as a single image.
+
+        The markers are splatted directly in an RGBA image having the size
+        (in pixels) of the axe in the output (see
+        :py:func:`rasterize_points`), which is then shown in the axe, so
+        that the axis, ticks and labels are unchanged.
+
+        """
+        import matplotlib as mpl
+        args = self.args
+
+        # The size of the image (in pixels)
+        width, height = self.get_axe_size()
+        image = np.zeros((height, width, 4), dtype=np.uint8)
+
+        # The diameter of the markers, with their edge (in pixels)
+        size = ((args.point_size + mpl.rcParams["lines.markeredgewidth"]) *
+                args.dpi / 72)
+
+        ylim = self.get_ylim()
+        parity = self.twopoint.chrom.map(self.layout.parity).values
+        for i, color in enumerate(self.get_colors()):
+            data = self.twopoint[parity == i]
+            rgba = np.array(mpl.colors.colorConverter.to_rgba(color)) * 255
+            rasterize_points(image, data.cum_pos.values, data.conf.values,
+                             self.xlim, ylim, size, rgba.round())
+
+        return [self.ax.imshow(
+            image, extent=self.xlim + ylim, aspect="auto", origin="upper",
+            interpolation="nearest", zorder=2,
+        )]
+
+    def draw_twopoint_density(self):
+        """Draws the density of the non-significant two point markers.
+
+        The markers are counted in square cells (of the size of a marker) of
+        a 2D histogram, computed for the odd and even chromosomes at once
+        (see :py:func:`compute_density`). The counts (on a log scale) are
+        colored with a ramp going from a pale tint to the color of the
+        chromosome, and shown as a single image in the axe. The significant
+        markers are drawn (and annotated) individually over the image.
+
+        """
+        import matplotlib as mpl
+        args = self.args
+
+        # The size of the image and of the cells (in pixels)
+        width, height = self.get_axe_size()
+        cell = max(int(round(args.point_size * args.dpi / 72)), 1)
+        nb_cols = int(np.ceil(width / cell))
+        nb_rows = int(np.ceil(height / cell))
+
+        # The limits of the image (a whole number of cells)
+        ylim = self.get_ylim()
+        xlim = (self.xlim[0], self.xlim[0] + (self.xlim[1] - self.xlim[0]) *
+                nb_cols * cell / width)
+        ylim = (ylim[1] - (ylim[1] - ylim[0]) * nb_rows * cell / height,
+                ylim[1])
+
+        data = self.twopoint[~self.sig_mask]
+        parity = data.chrom.map(self.layout.parity).values
+        image = np.zeros((nb_rows, nb_cols, 4))
+        for i, color in enumerate(self.get_colors()):
+            counts = compute_density(data.cum_pos.values[parity == i],
+                                     data.conf.values[parity == i], xlim,
+                                     ylim, nb_cols, nb_rows)
+            if not counts.any():
+                continue
+            ramp = mpl.colors.LinearSegmentedColormap.from_list(
+                "density", [blend_color(color, DENSITY_RAMP_START), color],
+            )
+            levels = np.log1p(counts) / np.log1p(counts.max())
+            image[counts > 0] = ramp(levels[counts > 0])
+
+        return [self.ax.imshow(
+            image, extent=xlim + ylim, aspect="auto", origin="upper",
+            interpolation="nearest", zorder=2,
+        )]
+
+    def draw_multipoint(self):
+        """Draws the multipoint lines (one per chromosome).
+
+        The lines are simplified to at most four vertices per column (see
+        :py:func:`simplify_line`), using a few columns per pixel of the
+        output.
+
+        """
+        if self.multipoint is None:
+            return []
+
+        # The number of columns spanning the X axis
+        nb_columns = int(np.ceil(self.ax.get_position().width *
+                                 self.args.graph_width * self.args.dpi *
+                                 LINE_COLUMNS_PER_PIXEL))
+
+        # The simplified line, broken between the chromosomes
+        data = self.multipoint
+        keep = simplify_line(data.cum_pos.values, data.conf.values,
+                             self.xlim, nb_columns)
+        data = data.iloc[keep]
+        breaks = np.flatnonzero(np.diff(data.chrom.values)) + 1
+        x = np.insert(data.cum_pos.values.astype(float), breaks, np.nan)
+        y = np.insert(data.conf.values.astype(float), breaks, np.nan)
+        parity = np.insert(data.chrom.map(self.layout.parity).values,
+                           breaks, -1)
+
+        # A single artist per color
+        if self.twopoint is not None:
+            return self.ax.plot(x, y, ls="-", color=self.args.multipoint_color,
+                                lw=1.2)
+        artists = []
+        for i, color in enumerate(self.get_colors()):
+            artists.extend(self.ax.plot(x, np.where(parity == i, y, np.nan),
+                                        ls="-", color=color, lw=1.2))
+        return artists
+
+    def draw_ablines(self):
+        """Draws the horizontal lines."""
+        artists = [
+            self.ax.axhline(y=abline_position, color="black", ls="--", lw=1.2)
+            for abline_position in self.args.abline
+        ]
+        if self.conf_min < 0:
+            artists.append(self.ax.axhline(y=0, color="black", ls="-",
+                                           lw=1.2))
+        return artists
+
+    def draw_significant(self):
+        """Draws (and annotates) the significant two point markers."""
+        self.annots = []
+        if self.twopoint is None:
+            return []
+
+        args = self.args
+        significant = self.twopoint[self.sig_mask]
+        artists = self.ax.plot(
+            significant.cum_pos, significant.conf, marker="o", ls="None",
+            ms=args.significant_point_size, mfc=args.significant_color,
+            mec=args.significant_color,
+        )
+
+        # If we want annotation
+        if not args.no_annotation:
+            for i, (m_index, m) in enumerate(significant.iterrows()):
+                # The confidence to write
+                the_conf = "{:.3f}".format(m.conf)
+                if args.use_pvalues_flag:
+                    the_conf = str(10 ** (-1 * m.conf))
+
+                # The label of the annotation (with the nearest gene)
+                label = "\n".join([m.snp, the_conf])
+                if self.sig_genes is not None and self.sig_genes[i]:
+                    label += "\n" + self.sig_genes[i]
+
+                annot = self.ax.annotate(
+                    label,
+                    xy=(m.cum_pos, m.conf),
+                    xycoords="data",
+                    size=10,
+                    xytext=(m.cum_pos, self.conf_max),
+                    va="center",
+                    bbox=dict(boxstyle="round", fc="white", ec="black"),
+                    textcoords="data",
+                    arrowprops=dict(arrowstyle="->", shrinkA=6, shrinkB=5),
+                )
+                self.annots.append(annot)
+
+        return artists + self.annots
+
+    def get_ylim(self):
+        """Returns the limits of the Y axis (with padding)."""
+        padding = 0.39
+        if self.args.no_y_padding:
+            padding = 0
+        return self.conf_min - padding, self.conf_max + padding
+
+    def set_limits(self):
+        """Sets the limits of the X and Y axis."""
+        self.ax.set_ylim(*self.get_ylim())
+        self.ax.set_xlim(*self.xlim)
+
+    def save(self):
+        """Saves the figure (and the PNG version, if required)."""
+        args = self.args
+        for graph_format in get_save_formats(args):
+            fn = args.outFile_name + "." + graph_format
+            if graph_format == "html":
+                write_html_plot(self, fn)
+            elif graph_format == "png" and hasattr(self.figure.canvas,
+                                                   "copy_from_bbox"):
+                self.save_composited(fn)
+            else:
+                self.figure.savefig(fn, bbox_inches="tight")
+
+        if args.web:
+            print(args.outFile_name + ".png")
+
+    def save_composited(self, fn):
+        """Saves the figure in PNG, compositing on the raster background.
+
+        Args:
+            fn (str): the name of the PNG file.
+
+        The static layers are rendered once (the first time the template is
+        saved), then only the other layers (and the Y axis, with its ticks and
+        label) are drawn on top of the background.
+        The image is then cropped as with ``bbox_inches="tight"``.
+
+        """
+        import matplotlib as mpl
+        import matplotlib.image as mpimg
+
+        canvas = self.figure.canvas
+        self.figure.set_dpi(self.args.dpi)
+
+        # The artists to draw on top of the background (the Y axis depends on
+        # the confidence values)
+        overlay = []
+        for name in self.layer_options.keys():
+            if name not in self.static_layers:
+                overlay.extend(self.layers.get(name, []))
+        overlay.append(self.ax.yaxis)
+
+        # Rendering (or restoring) the background
+        if self.template.background is None:
+            for artist in overlay:
+                artist.set_visible(False)
+            canvas.draw()
+            self.template.background = canvas.copy_from_bbox(self.figure.bbox)
+            for artist in overlay:
+                artist.set_visible(True)
+        else:
+            canvas.restore_region(self.template.background)
+
+        renderer = canvas.get_renderer()
+        for artist in overlay:
+            artist.draw(renderer)
+
+        # Cropping the image
+        dpi = self.figure.dpi
+        pad = mpl.rcParams["savefig.pad_inches"]
+        bbox = self.figure.get_tightbbox(renderer)
+        image = np.asarray(canvas.buffer_rgba())
+        height, width = image.shape[:2]
+        x0 = max(int(round((bbox.x0 - pad) * dpi)), 0)
+        x1 = min(x0 + int((bbox.width + 2 * pad) * dpi), width)
+        y0 = max(int(round(height - (bbox.y1 + pad) * dpi)), 0)
+        y1 = min(y0 + int((bbox.height + 2 * pad) * dpi), height)
+
+        mpimg.imsave(fn, np.ascontiguousarray(image[y0:y1, x0:x1]), dpi=dpi)
+
+
+def main():
+    """The main method of the program."""
+    # Getting and checking the options
+    args = parse_args()
+    check_args(args)
+
+    # In watch mode, the plot is re-rendered each time something changes
+    if args.watch:
+        watch_and_render(args)
+        return
+
+    # Reading the input files (and sketching the p values for the QQ plots)
+    sketches = {} if args.qq else None
+    two_point, multi_point = read_input_files(args, sketches)
+
+    # Creating one set of plots per confidence value column
+    if len(get_conf_columns(args)) > 1:
+        create_phenotype_plots(two_point, multi_point, args, sketches)
+        return
+
+    # Creating the plots
+    sketch = None
+    if sketches is not None:
+        sketch = sketches[get_conf_columns(args)[0]]
+    create_plots(two_point, multi_point, args, sketch=sketch)
+
+
+def create_plots(twopoint, multipoint, args, layout=None, sketch=None,
+                 save_only=False):
+    """Creates all the required plots from marker data.
+
+    Args:
+        twopoint (pandas.DataFrame): the two point data
+                                     (``None`` if not available).
+        multipoint (pandas.DataFrame): the multipoint data
+                                       (``None`` if not available).
+        args (argparse.Namespace): the options and arguments of the program.
+        layout (pandas.DataFrame): the layout of the chromosomes (``None`` to
+                                   compute it from the data).
+        sketch (QuantileSketch): the sketch of the two point p values
+                                 (``None`` if no QQ plot is required).
+        save_only (bool): only save the plots (never show them)?
+
+    """
+    # Creating the QQ plot
+    if sketch is not None:
+        create_qq_plot(sketch, args, save_only)
+
+    # Creating one plot per chromosome
+    if args.per_chromosome:
+        create_per_chromosome_plots(twopoint, multipoint, args)
+
+    # Creating the tile pyramid
+    if args.tiles:
+        create_tile_pyramid(twopoint, multipoint, args)
+
+    # Creating the plots
+    create_manhattan_plot(twopoint, multipoint, args, layout, save_only)
+
+
+def get_conf_columns(args):
+    """Returns the names of the confidence value (p value or LOD) columns."""
+    if args.use_pvalues_flag:
+        return args.col_pvalue
+    return args.col_lod
+
+
+def create_phenotype_plots(twopoint, multipoint, args, sketches=None):
+    """Creates the plots of each of the confidence value columns.
+
+    Args:
+        twopoint (pandas.DataFrame): the two point data, with one column per
+                                     confidence value column (``None`` if not
+                                     available).
+        multipoint (pandas.DataFrame): the multipoint data, with one column
+                                       per confidence value column (``None``
+                                       if not available).
+        args (argparse.Namespace): the options and arguments of the program.
+        sketches (dict): the sketch of each p value column (``None`` if no QQ
+                         plot is required).
+
+    The input files were parsed once (the chromosome encoding and the sort
+    order are shared), and the layout of the chromosomes is computed once, so
+    that all the plots have the same X axis. The plots are saved in
+    ``<output>.<column>.<format>``, and are created in parallel if more than
+    one process is required.
+
+    """
+    chrom_spacing = 25000000 if args.phys_pos_flag else 25.0
+    layout = compute_chrom_layout(twopoint, multipoint, chrom_spacing,
+                                  args.chrom_lengths, args.contigs,
+                                  args.unplaced_below)
+
+    # Creating the tasks
+    tasks = []
+    for column in get_conf_columns(args):
+        data = [None if d is None else select_conf_column(d, column, args)
+                for d in (twopoint, multipoint)]
+        sketch = None if sketches is None else sketches[column]
+        tasks.append((column, args, data[0], data[1], layout, sketch))
+
+    # Plotting
+    logger.info("Plotting {} columns using {} process(es)".format(
+        len(tasks), args.nb_process,
+    ))
+    if args.nb_process > 1:
+        # Each process plots a contiguous block of columns, so that it
+        # creates a single figure template (see FigureTemplate)
+        chunksize = int(math.ceil(len(tasks) / args.nb_process))
+        pool = multiprocessing.Pool(processes=args.nb_process)
+        try:
+            pool.map(plot_conf_column, tasks, chunksize=chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            plot_conf_column(task)
+
+
+def select_conf_column(data, column, args):
+    """Selects a single confidence value column.
+
+    Args:
+        data (pandas.DataFrame): the marker data (with one column per
+                                 confidence value column).
+        column (str): the name of the column to select.
+        args (argparse.Namespace): the options and arguments of the program.
+
+    Returns:
+        pandas.DataFrame: the marker data, with the ``conf`` column.
+
+    """
+    data = data[["chrom", "pos", "snp", column]].rename(
+        columns={column: "conf"},
+    )
+    data = data[data.conf.notnull()]
+    if args.min_conf is not None:
+        data = data[data.conf >= args.min_conf]
+    return data
+
+
+def plot_conf_column(task):
+    """Plots a single confidence value column (to be used by a pool).
+
+    Args:
+        task (tuple): the name of the column, the options, the two point and
+                      the multipoint data, the layout of the chromosomes and
+                      the sketch of the p values.
+
+    """
+    column, args, twopoint, multipoint, layout, sketch = task
+
+    # The options for this column
+    args = argparse.Namespace(**vars(args))
+    args.outFile_name = "{}.{}".format(args.outFile_name, column)
+    if args.use_pvalues_flag:
+        args.col_pvalue = [column]
+    else:
+        args.col_lod = [column]
+
+    # The processes can't have children, and can't show the figures
+    save_only = multiprocessing.current_process().daemon
+    if save_only:
+        args.nb_process = 1
+
+    create_plots(twopoint, multipoint, args, layout, sketch, save_only)
+
+
+def read_input_files(args, sketches=None):
+    """Reads the two point and the multipoint input files.
+
+    Args:
+        args (argparse.Namespace): the options and arguments of the program.
+        sketches (dict): if not ``None``, the quantile sketch of each p value
+                         column of the two point data is added to it.
+
+    Returns:
+        tuple: the two point and the multipoint data (``None`` if not
+               available).
+
+    Note
+    ----
+
+        If an excluded contig (``--exclude-chr``) is not in the input files,
+        a :py:class:`ProgramError` is raised.
+
+    """
+    # Reading the input file for two point linkage
+    two_point = None
+    if args.twopoint is not None:
+        two_point = read_input_file(args.twopoint, args.phys_pos_flag,
+                                    args.use_pvalues_flag, args, sketches)
+
+    # Reading the input file for multipoint linkage
+    multi_point = None
+    if args.multipoint is not None:
+        multi_point = read_input_file(args.multipoint, args.phys_pos_flag,
+                                      args.use_pvalues_flag, args)
+
+    # Checking the excluded contigs (a mistyped name is a new contig, which
+    # was never seen in the input files, nor in the order or lengths files)
+    unknown = [args.contigs.label(chrom) for chrom in args.exclude_chr
+               if args.contigs.is_contig(chrom) and
+               chrom not in args.contigs.ranks]
+    if unknown:
+        raise ProgramError("--exclude-chr: unknown chromosomes {}".format(
+            ", ".join(sorted(unknown)),
+        ))
+
+    return two_point, multi_point
+
+
+def read_input_file(i_fn, use_bp, use_p, options, sketches=None):
+    """Reads input file.
+
+    Args:
+        i_fn (str): the name of the input file.
+        use_bp (bool): use physical position (bp) rather than genetic position?
+        use_p (bool): use *p values* instead of *lod score*?
+        options (argparse.Namespace): the options.
+        sketches (dict): if not ``None``, the quantile sketch (see
+                         :py:class:`QuantileSketch`) of each confidence value
+                         column is added to it (by column name).
+
+
+    Returns:
+        pandas.DataFrame:  The array will contain the following names: ``chr``,
+                           ``pos``, ``snp`` and ``conf`` (or one column per
+                           confidence value column, named after it, if there
+                           are many of them).
+
+    This function reads any kind of input file, as long as the file is
+    tab-separated (or in the Parquet or Arrow IPC/Feather format, see
+    :py:func:`read_columnar_file`) and that it contains columns with the
+    following headers:
+
+    ======================  ===============================================
+            Header                           Description
+    ======================  ===============================================
+    ``chr``                 The name of the chromosome
+    ``snp``                 The name of the marker
+    ``pos`` or ``cm``       The physical or genetic position (respectively)
+    ``lod`` or ``p_value``  The confidence value (either *lod score* or *p
+                            value*, respectively)
+    ======================  ===============================================
+
+    The file is read and processed chunk by chunk (see
+    :py:func:`process_input_chunk`), and the quantile sketches are computed
+    during the same pass.
+
+    Note
+    ----
+
+        If there is a problem while reading the input file(s),
+        a :py:class:`ProgramError` will be raised, and the program will be
+        terminated.
+
+    """
+    # Reading the data (the markers below the floor are required for the
+    # sketches)
+    if get_input_format(i_fn) != "text":
+        chunks = read_columnar_file(i_fn, use_bp, use_p, options,
+                                    filter_conf=sketches is None)
+
+    else:
+        chunks = pd.read_csv(i_fn, sep="\t", chunksize=1e6,
+                             low_memory=False)
+
+    # Processing the chunks (the reader is closed, even on error)
+    try:
+        data = [
+            process_input_chunk(chunk, i_fn, use_bp, use_p, options,
+                                sketches)
+            for chunk in chunks
+        ]
+    finally:
+        chunks.close()
+    if not data:
+        raise ProgramError("{}: no data".format(i_fn))
+    data = pd.concat(data, ignore_index=True)
+    if data.empty:
+        raise ProgramError("{}: no marker to plot".format(i_fn))
+
+    # Ordering (if not already sorted) and returning
+    if not is_sorted(data):
+        data = data.sort_values(by=["chrom", "pos"])
+    return data
+
+
+def process_input_chunk(data, i_fn, use_bp, use_p, options, sketches):
+    """Processes a chunk of an input file.
+
+    Args:
+        data (pandas.DataFrame): the chunk of the input file.
+        i_fn (str): the name of the input file.
+        use_bp (bool): use physical position (bp) rather than genetic position?
+        use_p (bool): use *p values* instead of *lod score*?
+        options (argparse.Namespace): the options.
+        sketches (dict): the quantile sketch of each confidence value column
+                         (``None`` if not required).
+
+    Returns:
+        pandas.DataFrame: the required columns of the chunk (see
+                          :py:func:`read_input_file`).
+
+    """
+    # Checking we have the required column
+    conf_cols = options.col_pvalue if use_p else options.col_lod
+    required_cols = {options.col_chr, options.col_name,
+                     options.col_pos if use_bp else options.col_cm}
+    required_cols.update(conf_cols)
+    same_col = required_cols & set(data.columns)
+    if same_col != required_cols:
+        raise ProgramError("{}: missing columns {}".format(
+            i_fn,
+            ", ".join(required_cols - same_col),
+        ))
+
+    # Renaming the columns (the confidence value columns keep their name if
+    # there are many of them)
+    pos_col = options.col_pos if use_bp else options.col_cm
+    data = data[[options.col_chr, pos_col, options.col_name] + conf_cols]
+    if len(conf_cols) == 1:
+        data = data.rename(columns={conf_cols[0]: "conf"})
+        conf_cols = ["conf"]
+    data = data.rename(columns={
+        options.col_chr: "chrom",
+        pos_col: "pos",
+        options.col_name: "snp",
+    })
+
+    # Removing the markers with missing values (a missing confidence value is
+    # kept when there are many columns, see :py:func:`select_conf_column`)
+    required_cols = ["chrom", "pos", "snp"]
+    if conf_cols == ["conf"]:
+        required_cols.append("conf")
+    data = data.dropna(subset=required_cols)
+
+    # Encoding the chromosomes and extracting required ones
+    data["chrom"] = options.contigs.encode(data.chrom.values)
+    data = data[~data.chrom.isin(options.exclude_chr)]
+
+    # Checking the markers against the chromosome lengths
+    if options.chrom_lengths is not None:
+        check_chrom_lengths(data, options.chrom_lengths, options.contigs,
+                            i_fn)
+
+    # If p values, we modify
+    if use_p:
+        data[conf_cols] = -1 * np.log10(data[conf_cols])
+
+    # Adding the values to the sketches
+    if sketches is not None:
+        names = options.col_pvalue if use_p else options.col_lod
+        for name, conf_col in zip(names, conf_cols):
+            sketch = QuantileSketch(data[conf_col].values)
+            if name in sketches:
+                sketch = sketches[name].merge(sketch)
+            sketches[name] = sketch
+
+    # Keeping only the markers above the floor (for at least one column)
+    if options.min_conf is not None:
+        data = data[(data[conf_cols] >= options.min_conf).any(axis=1)]
+
+    return data
+
+
+def check_chrom_lengths(data, lengths, contigs, i_fn):
+    """Checks that the markers are on the chromosomes (of known lengths).
+
+    Args:
+        data (pandas.DataFrame): the marker data.
+        lengths (pandas.Series): the length of each chromosome.
+        contigs (ContigNames): the codes of the chromosomes.
+        i_fn (str): the name of the input file.
+
+    The chromosomes missing from the lengths (*e.g.* the pseudo-autosomal
+    region, XY, which uses the positions of X) are not checked (see
+    :py:func:`compute_chrom_layout`).
+
+    Note
+    ----
+
+        If a marker is after the end of its chromosome (*e.g.* if the genome
+        build is not the right one), a :py:class:`ProgramError` is raised.
+
+    """
+    outside = data.pos > data.chrom.map(lengths)
+    if outside.any():
+        marker = data[outside].iloc[0]
+        raise ProgramError("{}: {}: position {} is after the end of "
+                           "chromosome {} (wrong genome build?)".format(
+                               i_fn, marker.snp, marker.pos,
+                               contigs.label(marker.chrom),
+                           ))
+
+
+def read_chrom_lengths(genome_build, use_bp, contigs):
+    """Reads the chromosome lengths of a genome build (or of a file).
+
+    Args:
+        genome_build (str): the name of the genome build (``GRCh37`` or
+                            ``GRCh38``) or of a file.
+        use_bp (bool): use physical position (bp) rather than genetic position?
+        contigs (ContigNames): the codes of the chromosomes.
+
+    Returns:
+        pandas.Series: the length of each chromosome (in plotting order).
+
+    The file is tab-separated, without header, with the chromosomes and their
+    lengths (in bp or in cM, depending on the positions).
+
+    """
+    if genome_build in GENOME_BUILDS:
+        if not use_bp:
+            raise ProgramError("{}: chromosome lengths are in bp (requires "
+                               "--bp)".format(genome_build))
+        return pd.Series(GENOME_BUILDS[genome_build], index=BUILD_CHROMOSOMES,
+                         dtype=float)
+
+    if not os.path.isfile(genome_build):
+        raise ProgramError("{}: not a genome build ({}) nor a file".format(
+            genome_build,
+            ", ".join(sorted(GENOME_BUILDS.keys())),
+        ))
+
+    lengths = pd.read_csv(genome_build, sep="\t", header=None,
+                          names=["chrom", "length"], comment="#")
+    try:
+        lengths["length"] = lengths.length.astype(float)
+    except ValueError:
+        raise ProgramError("{}: invalid chromosome lengths".format(
+            genome_build,
+        ))
+    lengths["chrom"] = contigs.encode(lengths.chrom.astype(str).values)
+    if lengths.chrom.duplicated().any():
+        raise ProgramError("{}: duplicated chromosomes".format(genome_build))
+    return lengths.set_index("chrom").length.sort_index()
+
+
+def get_input_format(i_fn):
+    """Returns the format of an input file, from its extension.
+
+    Args:
+        i_fn (str): the name of the input file.
+
+    Returns:
+        str: the format of the file (``parquet``, ``ipc`` or ``text``).
+
+    """
+    extension = os.path.splitext(i_fn)[1].lower()
+    return COLUMNAR_FORMATS.get(extension, "text")
+
+
+def read_columnar_file(i_fn, use_bp, use_p, options, filter_conf=True):
+    """Reads a Parquet or an Arrow IPC (Feather) input file.
+
+    Args:
+        i_fn (str): the name of the input file.
+        use_bp (bool): use physical position (bp) rather than genetic position?
+        use_p (bool): use *p values* instead of *lod score*?
+        options (argparse.Namespace): the options.
+        filter_conf (bool): filter the markers below the floor?
+
+    Returns:
+        generator: the chunks (:py:class:`pandas.DataFrame`) with the required
+                   columns of the input file.
+
+    Only the required columns are read (projection), and the excluded
+    chromosomes and the markers below the floor (``--min-conf``) are filtered
+    while reading (predicate pushdown, which skips the row groups of Parquet
+    files using their statistics). The files are memory-mapped.
+
+    Note
+    ----
+
+        The :py:mod:`pyarrow` module is required to read those files. If it
+        is missing, a :py:class:`ProgramError` is raised.
+
+    """
+    try:
+        import pyarrow.dataset as ds
+        import pyarrow.fs as pafs
+        import pyarrow.types as patypes
+    except ImportError:
+        raise ProgramError("{}: the pyarrow module is required to read "
+                           "Parquet and Arrow files".format(i_fn))
+
+    # The required columns
+    pos_col = options.col_pos if use_bp else options.col_cm
+    conf_cols = options.col_pvalue if use_p else options.col_lod
+    columns = [options.col_chr, options.col_name, pos_col] + conf_cols
+
+    dataset = ds.dataset(
+        i_fn, format=get_input_format(i_fn),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+    missing = set(columns) - set(dataset.schema.names)
+    if missing:
+        raise ProgramError("{}: missing columns {}".format(
+            i_fn,
+            ", ".join(missing),
+        ))
+
+    # The filters on the chromosomes and on the confidence value (the
+    # excluded contigs are only filtered once encoded, so that their names
+    # are checked, see :py:func:`read_input_files`)
+    condition = None
+    excluded = {chrom for chrom in options.exclude_chr
+                if not options.contigs.is_contig(chrom)}
+    if excluded:
+        if patypes.is_integer(dataset.schema.field(options.col_chr).type):
+            excluded = sorted(excluded)
+        else:
+            excluded = get_chr_names(excluded, options.contigs)
+        condition = ~ds.field(options.col_chr).isin(excluded)
+    if filter_conf and options.min_conf is not None:
+        conf_condition = None
+        for conf_col in conf_cols:
+            column_condition = ds.field(conf_col) >= options.min_conf
+            if use_p:
+                column_condition = ds.field(conf_col) <= \
+                    10 ** -options.min_conf
+            if conf_condition is None:
+                conf_condition = column_condition
+            else:
+                conf_condition = conf_condition | column_condition
+        if condition is None:
+            condition = conf_condition
+        else:
+            condition = condition & conf_condition
+
+    batches = dataset.to_batches(columns=columns, filter=condition)
+    return (batch.to_pandas() for batch in batches)
+
+
+def get_chr_names(chromosomes, contigs):
+    """Returns the possible names of encoded chromosomes.
+
+    Args:
+        chromosomes (set): the encoded chromosomes (see :py:func:`encode_chr`).
+        contigs (ContigNames): the codes of the chromosomes.
+
+    Returns:
+        list: the names which are encoded as one of the chromosomes.
+
+    """
+    names = {23: "X", 24: "Y", 25: "XY", 26: "MT"}
+    chr_names = set()
+    for chromosome in chromosomes:
+        if contigs.is_contig(chromosome):
+            chr_names.add(contigs.label(chromosome))
+            continue
+        variants = {str(chromosome)}
+        if chromosome in names:
+            name = names[chromosome]
+            variants.update({name, name.lower(), name.capitalize(),
+                             name[0].lower() + name[1:]})
+        if chromosome == 26:
+            variants.add("M")
+        chr_names.update(variants)
+        chr_names.update("chr" + name for name in variants)
+    return sorted(chr_names)
+
+
+def is_sorted(data):
+    """Checks if the markers are sorted by chromosome and position."""
+    chrom_diff = np.diff(data.chrom.values)
+    pos_diff = np.diff(data.pos.values)
+    return bool(np.all((chrom_diff > 0) | ((chrom_diff == 0) &
+                                           (pos_diff >= 0))))
+
+
+def compute_chrom_layout(twopoint, multipoint, chrom_spacing, lengths=None,
+                         contigs=None, unplaced_below=None):
+    """Computes the position of each chromosome on the X axis.
+
+    Args:
+        twopoint (pandas.DataFrame): the two point data
+                                     (``None`` if not available).
+        multipoint (pandas.DataFrame): the multipoint data
+                                       (``None`` if not available).
+        chrom_spacing (float): the maximal space between two chromosomes.
+        lengths (pandas.Series): the length of each chromosome (``None`` to
+                                 use the maximal position of the markers).
+        contigs (ContigNames): the codes of the chromosomes, with their
+                               plotting order (``None`` to plot in order of
+                               code).
+        unplaced_below (float): the contigs shorter than this are merged in a
+                                single bin (``None`` to keep all the contigs).
+
+    Returns:
+        pandas.DataFrame: the layout (indexed by chromosome, in plotting
+                          order) with the following columns: ``max_pos``,
+                          ``start`` (the offset to add to the positions),
+                          ``xmin`` and ``xmax`` (the limits of the chromosome
+                          box), ``tick``, ``parity`` (the parity of the
+                          chromosome index, for the colors), ``label`` and
+                          ``spacing`` (the space between two chromosomes).
+                          The merged contigs share the same box, tick, parity
+                          and label (see :py:func:`get_layout_bins`).
+
+    Note
+    ----
+
+        If the chromosomes are not the same for the two point and multipoint
+        data, a :py:class:`ProgramError` is raised.
+
+    When the chromosome lengths are known (*e.g.* from a reference genome
+    build), the layout doesn't depend on the markers, and it is the same for
+    all the plots. The chromosomes missing from the lengths (*e.g.* the
+    pseudo-autosomal region, XY) are added using their markers.
+
+    The space between two chromosomes is at most a fraction of the mean width
+    of the bins (see :py:const:`CHROM_SPACING_FRACTION`), so that it doesn't
+    dwarf the chromosomes of assemblies with many small contigs.
+
+    """
+    # The maximal position for each chromosome
+    max_pos = [data.groupby("chrom").pos.max()
+               for data in (twopoint, multipoint) if data is not None]
+    if lengths is not None:
+        missing = [chrom_max[~chrom_max.index.isin(lengths.index)]
+                   for chrom_max in max_pos]
+        max_pos = pd.concat([lengths] + missing).groupby(level=0).max()
+    elif len(max_pos) == 2:
+        if list(max_pos[0].index) != list(max_pos[1].index):
+            raise ProgramError("chromosomes are not the same for twopoint and "
+                               "multipoint data")
+        max_pos = pd.concat(max_pos, axis=1).max(axis=1)
+    else:
+        max_pos = max_pos[0]
+
+    # The plotting order (the merged contigs are at the end)
+    layout = pd.DataFrame({"max_pos": max_pos}, index=max_pos.index)
+    merged = np.zeros(len(layout), dtype=bool)
+    labels = layout.index.astype(str)
+    if contigs is not None:
+        layout = layout.loc[contigs.sort(layout.index)]
+        labels = [contigs.label(code) for code in layout.index]
+        if unplaced_below is not None:
+            merged = np.array([contigs.is_contig(code)
+                               for code in layout.index]) & \
+                (layout.max_pos.values < unplaced_below)
+            order = np.argsort(merged, kind="mergesort")
+            layout = layout.iloc[order]
+            labels = np.asarray(labels, dtype=object)[order]
+            merged = merged[order]
+    layout["label"] = np.where(merged, UNPLACED_LABEL, labels)
+
+    # The space between the chromosomes (scaled to the genome)
+    nb_bins = np.sum(~merged) + merged.any()
+    chrom_spacing = min(
+        chrom_spacing,
+        CHROM_SPACING_FRACTION * layout.max_pos.sum() / max(nb_bins, 1),
+    )
+    layout["spacing"] = chrom_spacing
+
+    # The position of each chromosome (the merged contigs follow each other)
+    spacing = np.where(merged, 0, chrom_spacing)
+    if merged.any():
+        spacing[-1] = chrom_spacing
+    width = layout.max_pos + spacing
+    layout["start"] = width.cumsum() - width
+    layout["xmin"] = layout.start - (chrom_spacing / 2)
+    layout["xmax"] = layout.max_pos + layout.start + (chrom_spacing / 2)
+    if merged.any():
+        layout.loc[merged, "xmin"] = layout.xmin[merged].min()
+        layout.loc[merged, "xmax"] = layout.xmax[merged].max()
+    layout["tick"] = (layout.xmin + layout.xmax) / 2
+    new_bin = ~merged
+    new_bin[np.argmax(merged) if merged.any() else 0] = True
+    layout["parity"] = (np.cumsum(new_bin) - 1) % 2
+
+    return layout
+
+
+def get_layout_bins(layout):
+    """Returns the bins of a layout (a single bin for the merged contigs)."""
+    return layout.drop_duplicates(subset=["xmin", "xmax"])
+
+
+def natural_key(name):
+    """Returns the key to sort names in natural order (*e.g.* ``ctg2`` before
+    ``ctg10``)."""
+    return [int(part) if part.isdigit() else part
+            for part in re.split(r"(\d+)", name)]
+
+
+def thin_ticks(ticks, labels, xlim, width, font_size):
+    """Selects the tick labels which don't overlap.
+
+    Args:
+        ticks (numpy.ndarray): the positions of the ticks (sorted).
+        labels (numpy.ndarray): the labels of the ticks.
+        xlim (tuple): the limits of the X axis.
+        width (float): the width of the axis (in points).
+        font_size (float): the size of the font (in points).
+
+    Returns:
+        numpy.ndarray: the indexes of the ticks to keep.
+
+    The labels are only thinned when there are more than
+    :py:const:`THIN_TICKS_ABOVE` ticks (*e.g.* for assemblies with many
+    contigs), so that all the chromosomes are labelled on human plots. The
+    width of a label is estimated from its number of characters, and the
+    ticks are kept from left to right, as long as their label doesn't overlap
+    the previous one. The label of the merged contigs (``unplaced``) is always
+    kept, and the other labels must not overlap it.
+
+    """
+    if len(ticks) <= THIN_TICKS_ABOVE:
+        return np.arange(len(ticks))
+
+    labels = np.asarray(labels)
+    x = (np.asarray(ticks, dtype=float) - xlim[0]) * \
+        (width / (xlim[1] - xlim[0]))
+    half_width = np.array([len(str(label)) * 0.6 + 0.25 for label in labels])
+    half_width *= font_size / 2
+
+    # The labels which are always kept
+    required = labels == UNPLACED_LABEL
+    required_left = (x - half_width)[required]
+    required_right = (x + half_width)[required]
+
+    kept = []
+    right = -np.inf
+    for i in range(len(x)):
+        left = x[i] - half_width[i]
+        if not required[i]:
+            if left < right or np.any((left < required_right) &
+                                      (x[i] + half_width[i] > required_left)):
+                continue
+        kept.append(i)
+        right = x[i] + half_width[i]
+    return np.array(kept, dtype=np.int64)
+
+
+def rasterize_points(image, x, y, xlim, ylim, size, color):
+    """Splats circular markers of a single color in an RGBA image.
+
+    Args:
+        image (numpy.ndarray): the RGBA image (modified in place).
+        x (numpy.ndarray): the X coordinates of the markers.
+        y (numpy.ndarray): the Y coordinates of the markers.
+        xlim (tuple): the limits of the image on the X axis.
+        ylim (tuple): the limits of the image on the Y axis.
+        size (float): the diameter of the markers (in pixels).
+        color (numpy.ndarray): the RGBA color of the markers (0 to 255).
+
+    The center of each marker is first set in an occupancy grid (so that the
+    cost related to the number of markers is a single vectorized assignment).
+    The grid is then dilated by a disk of the marker's diameter, by combining
+    horizontal dilations (computed with cumulative sums) shifted vertically.
+    Only the rows containing markers are processed.
+
+    """
+    height, width = image.shape[:2]
+    radius = size / 2
+    reach = int(np.ceil(radius))
+
+    # The pixel of each marker (row 0 being at the top)
+    col = np.floor((x - xlim[0]) * (width / (xlim[1] - xlim[0])))
+    row = np.floor((ylim[1] - y) * (height / (ylim[1] - ylim[0])))
+    in_image = ((col >= -reach) & (col < width + reach) &
+                (row >= -reach) & (row < height + reach))
+    col = col[in_image].astype(np.int64) + reach
+    row = row[in_image].astype(np.int64) + reach
+
+    # The occupancy grid (padded by the reach of the markers)
+    occupied = np.zeros((height + 2 * reach, width + 2 * reach), dtype=bool)
+    occupied[row, col] = True
+    rows = np.flatnonzero(occupied.any(axis=1))
+    if len(rows) == 0:
+        return
+    top = rows[0]
+    occupied = occupied[top:rows[-1] + 1]
+    nb_rows, nb_cols = occupied.shape
+
+    # The cumulative sum of each row (with a leading 0 and padding)
+    cumsum = np.zeros((nb_rows, nb_cols + 2 * reach + 1), dtype=np.int32)
+    np.cumsum(occupied, axis=1, out=cumsum[:, reach + 1:nb_cols + reach + 1])
+    cumsum[:, nb_cols + reach + 1:] = cumsum[:, [nb_cols + reach]]
+
+    # Dilating the grid (the mask spans the occupied rows plus the reach)
+    mask = np.zeros((nb_rows + 2 * reach, nb_cols), dtype=bool)
+    dilations = {}
+    for dy in range(-reach, reach + 1):
+        if dy ** 2 > radius ** 2:
+            continue
+        half = int(np.floor(np.sqrt(radius ** 2 - dy ** 2)))
+        if half not in dilations:
+            start = reach - half
+            stop = start + nb_cols
+            dilations[half] = (cumsum[:, start + 2 * half + 1:
+                                      stop + 2 * half + 1] -
+                               cumsum[:, start:stop]) > 0
+        mask[reach + dy:reach + dy + nb_rows] |= dilations[half]
+
+    # Painting the image (removing the padding)
+    first_row = top - 2 * reach
+    mask_start = max(-first_row, 0)
+    mask_stop = min(height - first_row, len(mask))
+    if mask_stop <= mask_start:
+        return
+    mask = mask[mask_start:mask_stop, reach:reach + width]
+    image_rows = image[first_row + mask_start:first_row + mask_stop]
+    image_rows[mask] = color
+
+
+def compute_density(x, y, xlim, ylim, nb_cols, nb_rows):
+    """Counts the markers in the cells of a 2D histogram.
+
+    Args:
+        x (numpy.ndarray): the X coordinates of the markers.
+        y (numpy.ndarray): the Y coordinates of the markers.
+        xlim (tuple): the limits of the histogram on the X axis.
+        ylim (tuple): the limits of the histogram on the Y axis.
+        nb_cols (int): the number of columns of the histogram.
+        nb_rows (int): the number of rows of the histogram.
+
+    Returns:
+        numpy.ndarray: the number of markers in each cell (row 0 being at the
+                       top). The markers outside of the limits are ignored.
+
+    """
+    col = np.floor((x - xlim[0]) * (nb_cols / (xlim[1] - xlim[0])))
+    row = np.floor((ylim[1] - y) * (nb_rows / (ylim[1] - ylim[0])))
+    in_range = (col >= 0) & (col < nb_cols) & (row >= 0) & (row < nb_rows)
+    cells = (row[in_range] * nb_cols + col[in_range]).astype(np.int64)
+    counts = np.bincount(cells, minlength=nb_rows * nb_cols)
+    return counts.reshape(nb_rows, nb_cols)
+
+
+def blend_color(color, weight):
+    """Blends a color with white.
+
+    Args:
+        color (str): the color.
+        weight (float): the weight of the color (0 for white, 1 for the
+                        color).
+
+    Returns:
+        tuple: the RGB blended color.
+
+    """
+    import matplotlib as mpl
+    rgb = np.array(mpl.colors.colorConverter.to_rgb(color))
+    return tuple(1 - weight * (1 - rgb))
+
+
+def simplify_line(x, y, xlim, nb_columns):
+    """Simplifies a line for display (min/max per column).
+
+    Args:
+        x (numpy.ndarray): the X coordinates of the vertices (sorted).
+        y (numpy.ndarray): the Y coordinates of the vertices.
+        xlim (tuple): the limits of the X axis.
+        nb_columns (int): the number of columns spanning the X axis.
+
+    Returns:
+        numpy.ndarray: the (sorted) indexes of the vertices to keep.
+
+    For each column, only the first, the minimal, the maximal and the last
+    vertices are kept. Since all the other vertices are drawn inside the
+    vertical segment between the minimum and the maximum of the column, the
+    simplified line is visually identical to the original one when the
+    columns are as thin as the pixels of the output, while having at most
+    four vertices per column.
+
+    """
+    if len(x) <= 4 * nb_columns:
+        return np.arange(len(x))
+
+    # The column of each vertex
+    scale = nb_columns / (xlim[1] - xlim[0])
+    column = np.floor((x - xlim[0]) * scale).astype(np.int64)
+
+    # The first and last vertices of each column
+    change = np.flatnonzero(np.diff(column)) + 1
+    first = np.concatenate(([0], change))
+    last = np.concatenate((change - 1, [len(x) - 1]))
+
+    # The minimal and maximal vertices of each column (the sort is stable,
+    # so the columns have the same boundaries)
+    order = np.lexsort((y, column))
+
+    return np.unique(np.concatenate((first, last, order[first], order[last])))
+
+
+def create_manhattan_plot(twopoint, multipoint, args, layout=None,
+                          save_only=False):
+    """Creates the manhattan plot from marker data.
+
+    Args:
+        twopoint (pandas.DataFrame): the two point data
+                                     (``None`` if not available).
+        multipoint (pandas.DataFrame): the multipoint data
+                                       (``None`` if not available).
+        args (argparse.Namespace): the options and arguments of the program.
+        layout (pandas.DataFrame): the layout of the chromosomes (``None`` to
+                                   compute it from the data).
+        save_only (bool): only save the plot (never show it, without using
+                          :py:mod:`matplotlib.pyplot`)?
+
+    Creates manhattan plots from two point or multipoint data. Two point
+    results are shown in a manhattan plot using points (different color for
+    each of the chromosomes). Multi point results are shown using lines.
+
+    If both two and mutli point data are available, multi point results are
+    shown above two point data.
+
+    """
+    plt = import_pyplot(args, save_only)
+
+    # Creating the plot and drawing all the layers
+    plot = ManhattanPlot(twopoint, multipoint, args, layout)
+    plot.create_figure(plt)
+    plot.draw()
+
+    # Make the annotation draggable
+    drs = []
+    for annot in plot.annots:
+        dr = DraggableAnnotation(annot)
+        dr.connect()
+        drs.append(dr)
+
+    if save_only or args.no_annotation or (args.twopoint is None) or \
+            (args.graph_format == "html") or args.watch:
+        # Annotation is for two-point only (and is interactive in the HTML
+        # output, and not possible for rendering only), se we save the figure
+        plot.save()
+
+    else:
+        # There is some two-point data and annotation is asked, se we show
+        # the figure
+        plt.show()
+
+
+def create_qq_plot(sketch, args, save_only=False):
+    """Creates the QQ plot of the p values, with the genomic inflation factor.
+
+    Args:
+        sketch (QuantileSketch): the sketch of the p values.
+        args (argparse.Namespace): the options and arguments of the program.
+        save_only (bool): create the figure without
+                          :py:mod:`matplotlib.pyplot`?
+
+    The quantiles come from the sketch computed while reading the input file
+    (the p values are not read again), and only a single point per pixel is
+    drawn (see :py:func:`decimate_points`). The plot is saved in
+    ``<output>.qq.<format>`` (PNG is used instead of HTML).
+
+    """
+    lambda_gc = sketch.genomic_inflation()
+    logger.info("{}: genomic inflation factor (lambda GC) of {:.4f}".format(
+        args.outFile_name, lambda_gc,
+    ))
+
+    plt = import_pyplot(args, save_only)
+    figure = new_figure(plt, (args.graph_height, args.graph_height))
+    ax = figure.add_subplot(111)
+    ax.spines["top"].set_visible(False)
+    ax.spines["right"].set_visible(False)
+    ax.set_xlabel(r"Expected $-\log_{10}$ (p value)",
+                  fontsize=args.label_text_size)
+    ax.set_ylabel(r"Observed $-\log_{10}$ (p value)",
+                  fontsize=args.label_text_size)
+    ax.set_title(r"$\lambda_{{GC}}$ = {:.4f}".format(lambda_gc),
+                 fontsize=16, weight="bold")
+    ax.tick_params(labelsize=args.axis_text_size)
+
+    # The limits
+    expected, observed = sketch.qq_points()
+    limit = max(expected.max(), observed.max()) * 1.05
+    ax.set_xlim(0, limit)
+    ax.set_ylim(0, limit)
+    ax.plot([0, limit], [0, limit], ls="--", color="black")
+
+    # Only a single point per pixel of the output is drawn
+    position = ax.get_position()
+    width = int(round(position.width * args.graph_height * args.dpi))
+    height = int(round(position.height * args.graph_height * args.dpi))
+    keep = decimate_points(expected, observed, (0, limit), (0, limit),
+                           width, height)
+    ax.plot(expected[keep], observed[keep], marker="o", ms=args.point_size,
+            mfc=args.even_chromosome_color, mec=args.even_chromosome_color,
+            ls="None")
+
+    save_figure(figure, args.outFile_name + ".qq", args)
+    if plt is not None:
+        plt.close(figure)
+
+
+def save_figure(figure, name, args):
+    """Saves a figure in the required format (and in PNG).
+
+    Args:
+        figure (matplotlib.figure.Figure): the figure to save.
+        name (str): the name of the output file (without extension).
+        args (argparse.Namespace): the options and arguments of the program.
+
+    """
+    for graph_format in get_save_formats(args, html=False):
+        figure.savefig(name + "." + graph_format, bbox_inches="tight")
+
+
+def get_save_formats(args, html=True):
+    """Sets the saving parameters and returns the formats of the output.
+
+    Args:
+        args (argparse.Namespace): the options and arguments of the program.
+        html (bool): is the HTML format possible (otherwise, only the PNG
+                     version is saved)?
+
+    Returns:
+        list: the formats in which to save the figure (the required format,
+              and PNG).
+
+    """
+    import matplotlib as mpl
+    mpl.rcParams['savefig.dpi'] = args.dpi
+    mpl.rcParams['ps.papersize'] = "auto"
+    mpl.rcParams['savefig.orientation'] = "landscape"
+
+    formats = [args.graph_format]
+    if args.graph_format == "html" and not html:
+        formats = []
+    if args.graph_format != "png":
+        formats.append("png")
+    return formats
+
+
+def new_figure(plt, figsize):
+    """Creates a new figure.
+
+    Args:
+        plt (module): the :py:mod:`matplotlib.pyplot` module (``None`` to
+                      create a figure which is only saved).
+        figsize (tuple): the width and height of the figure (in inches).
+
+    Returns:
+        matplotlib.figure.Figure: the figure.
+
+    Figures which are only saved are not managed by
+    :py:mod:`matplotlib.pyplot`, and are drawn on an ``Agg`` canvas, whatever
+    the backend.
+
+    """
+    if plt is not None:
+        return plt.figure(figsize=figsize, frameon=True)
+
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure(figsize=figsize, frameon=True)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def chi2_isf(p):
+    """Returns the chi-squared statistic (one degree of freedom) of a p value.
+
+    Args:
+        p (float): the p value.
+
+    Returns:
+        float: the statistic *x* such that :math:`P(X > x) = p`.
+
+    Since :math:`P(X > x) = erfc(sqrt(x / 2))`, the inverse of the
+    complementary error function is found by bisection.
+
+    """
+    low, high = 0.0, 27.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if math.erfc(middle) > p:
+            low = middle
+        else:
+            high = middle
+    return 2 * ((low + high) / 2) ** 2
+
+
+def import_pyplot(args, save_only=False):
+    """Imports and returns :py:mod:`matplotlib.pyplot`.
+
+    Args:
+        args (argparse.Namespace): the options and arguments of the program.
+        save_only (bool): are the figures only saved?
+
+    Returns:
+        module: the :py:mod:`matplotlib.pyplot` module (``None`` if the
+                figures are only saved).
+
+    The non-interactive ``Agg`` backend is used when no annotation is
+    required, when the plot is re-rendered in watch mode or when the output is
+    HTML. When the figures are only saved (*e.g.* by the worker processes),
+    :py:mod:`matplotlib.pyplot` is not required (see :py:func:`new_figure`),
+    so that the backend of the program is left unchanged.
+
+    """
+    if save_only:
+        return None
+
+    import matplotlib as mpl
+    interactive = not (args.no_annotation or args.watch or
+                       args.graph_format == "html")
+    if not interactive:
+        mpl.use("Agg")
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ProgramError("Could not import matplotlib. The most common "
+                           "cause is that there is no available display, but "
+                           "annotation has been asked for... Try using the "
+                           "--no_annotation option.")
+
+    if not interactive:
+        plt.ioff()
 
-    def on_release(self, event):
-        """On release we reset the press data."""
-        if DraggableAnnotation.lock is not self:
-            return
+    return plt
 
-        self.press = None
-        DraggableAnnotation.lock = None
 
-        # turn off the annot animation property and reset the background
-        self.annot.set_animated(False)
-        self.background = None
+def watch_and_render(args):
+    """Renders the plot, and re-renders it each time the options change.
 
-        # redraw the full figure
-        self.annot.figure.canvas.draw()
+    Args:
+        args (argparse.Namespace): the options and arguments of the program.
 
-    def disconnect(self):
-        "Disconnect all the stored connection ids."""
-        self.annot.figure.canvas.mpl_disconnect(self.cidpress)
-        self.annot.figure.canvas.mpl_disconnect(self.cidrelease)
-        self.annot.figure.canvas.mpl_disconnect(self.cidmotion)
+    The processed marker data, the chromosome layout and the figure are kept
+    in memory. The options files (given on the command line using
+    ``@FILE``) and the input files are polled for modifications. When an
+    options file changes, the options are parsed again and only the layers
+    depending on the modified options are re-rendered (a modification of the
+    significant threshold only recomputes the significance masks). The input
+    files are read again only when their modification time changes (or when
+    an option related to the input changes).
 
+    """
+    plt = import_pyplot(args)
+
+    # The options files and the input files to watch
+    argv = sys.argv[1:]
+    options_fn = [arg[1:] for arg in argv if arg.startswith("@")]
+    mtimes = get_mtimes(options_fn + get_input_files(args))
+
+    # Reading the data and rendering the plot a first time
+    twopoint, multipoint = read_input_files(args)
+    plot = ManhattanPlot(twopoint, multipoint, args)
+    plot.create_figure(plt)
+    plot.draw()
+    plot.save()
+    logger.info("Watching for modifications (Ctrl+C to stop)")
+
+    while True:
+        time.sleep(WATCH_INTERVAL)
+
+        # Checking for modified files
+        new_mtimes = get_mtimes(options_fn + get_input_files(plot.args))
+        modified = {fn for fn, mtime in new_mtimes.items()
+                    if mtimes.get(fn) != mtime}
+        mtimes = new_mtimes
+        if not modified:
+            continue
+
+        # Parsing the options again
+        new_args = plot.args
+        if modified & set(options_fn):
+            try:
+                new_args = parse_args(argv)
+                check_args(new_args)
+            except (ProgramError, SystemExit) as e:
+                logger.error("invalid options: {}".format(e))
+                continue
+
+        try:
+            # Are the input files (or how they are read) modified?
+            reread = {
+                name for name in ("twopoint", "multipoint")
+                if getattr(new_args, name) in modified
+            }
+            if plot.changed_options(new_args, ManhattanPlot.input_options):
+                reread = {"twopoint", "multipoint"}
+
+            if reread:
+                logger.info("Reading {} data".format(" and ".join(
+                    sorted(reread)
+                )))
+                data = {"twopoint": plot.twopoint,
+                        "multipoint": plot.multipoint}
+                for name in reread:
+                    fn = getattr(new_args, name)
+                    data[name] = None
+                    if fn is not None:
+                        data[name] = read_input_file(
+                            fn, new_args.phys_pos_flag,
+                            new_args.use_pvalues_flag, new_args,
+                        )
+                plot.args = new_args
+                plot.set_data(data["twopoint"], data["multipoint"])
+                plot.create_figure(plt)
+                plot.draw()
+
+            else:
+                # The data keeps its chromosome codes
+                new_args.contigs = plot.args.contigs
+                new_args.chrom_lengths = plot.args.chrom_lengths
+                layers = plot.update_args(new_args)
+                if not layers:
+                    logger.info("No layer to re-render")
+                else:
+                    logger.info("Re-rendering {}".format(", ".join(layers)))
+                plot.draw(layers)
+
+            plot.save()
+
+        except ProgramError as e:
+            logger.error(e.message)
+
+
+def get_input_files(args):
+    """Returns the list of the input files (two point and multipoint)."""
+    return [fn for fn in (args.twopoint, args.multipoint) if fn is not None]
+
+
+def get_mtimes(filenames):
+    """Gets the modification time of files.
 
-class ProgramError(Exception):
-    """An :py:class:`Exception` raised in case of a problem.
+    Args:
+        filenames (list): the names of the files.
 
-    :param msg: the message to print to the user before exiting.
-    :type msg: string
+    Returns:
+        dict: the modification time for each of the files (``None`` if the
+              file doesn't exist).
 
     """
-    def __init__(self, msg):
-        """Construction of the :py:class:`ProgramError` class.
-
-        :param msg: the message to print to the user
-        :type msg: string
+    mtimes = {}
+    for fn in filenames:
+        try:
+            mtimes[fn] = os.path.getmtime(fn)
+        except OSError:
+            mtimes[fn] = None
+    return mtimes
 
-        """
-        self.message = str(msg)
 
-    def __str__(self):
-        """Creates a string representation of the message."""
-        return self.message
+def create_per_chromosome_plots(twopoint, multipoint, args):
+    """Creates one zoomed plot per chromosome.
 
+    Args:
+        twopoint (pandas.DataFrame): the two point data
+                                     (``None`` if not available).
+        multipoint (pandas.DataFrame): the multipoint data
+                                       (``None`` if not available).
+        args (argparse.Namespace): the options and arguments of the program.
 
-def main():
-    """The main method of the program."""
-    # Getting and checking the options
-    args = parse_args()
-    check_args(args)
+    The numerical values of the (already parsed and sorted) markers are
+    copied once in shared memory, and each chromosome is plotted by a process
+    of a pool, which only receives the boundaries of its slice (and the names
+    of its significant markers, for the annotation). The plots are saved in
+    ``<output>.chr<N>.<format>`` (or ``<output>.<contig>.<format>``), with
+    their own Y limits.
 
-    # Reading the input file for two point linkage
-    two_point = None
-    if args.twopoint is not None:
-        two_point = read_input_file(args.twopoint, args.phys_pos_flag,
-                                    args.use_pvalues_flag, args)
+    """
+    # The chromosomes to plot
+    chromosomes = compute_chrom_layout(twopoint, multipoint, 0).index.values
 
-    # Reading the input file for multipoint linkage
-    multi_point = None
-    if args.multipoint is not None:
-        multi_point = read_input_file(args.multipoint, args.phys_pos_flag,
-                                      args.use_pvalues_flag, args)
+    # Putting the values in shared memory
+    blocks = {}
+    shms = []
+    bounds = {}
+    try:
+        for name, data in (("twopoint", twopoint),
+                           ("multipoint", multipoint)):
+            if data is None:
+                continue
+            values = np.vstack([data.chrom.values, data.pos.values,
+                                data.conf.values]).astype(np.float64)
+            shm, blocks[name] = share_array(values)
+            if shm is not None:
+                shms.append(shm)
+            bounds[name] = (
+                np.searchsorted(values[0], chromosomes, side="left"),
+                np.searchsorted(values[0], chromosomes, side="right"),
+            )
+
+        # Creating the tasks
+        tasks = []
+        for i, chrom in enumerate(chromosomes):
+            task_blocks = {}
+            for name, block in blocks.items():
+                start = bounds[name][0][i]
+                stop = bounds[name][1][i]
+                task_blocks[name] = block_slice(block, start, stop)
+
+            # The name of the significant markers
+            sig_names = []
+            if twopoint is not None:
+                start = bounds["twopoint"][0][i]
+                stop = bounds["twopoint"][1][i]
+                chrom_data = twopoint.iloc[start:stop]
+                sig_names = list(chrom_data.snp[
+                    chrom_data.conf >= args.significant_threshold
+                ])
+
+            tasks.append((chrom, task_blocks, sig_names))
+
+        # Plotting (the options are sent once to each process)
+        logger.info("Plotting {} chromosomes using {} process(es)".format(
+            len(tasks), args.nb_process,
+        ))
+        if args.nb_process > 1:
+            pool = multiprocessing.Pool(processes=args.nb_process,
+                                        initializer=init_worker,
+                                        initargs=(args, ))
+            try:
+                pool.map(plot_chromosome, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            init_worker(args)
+            for task in tasks:
+                plot_chromosome(task)
 
-    # Creating the plots
-    create_manhattan_plot(two_point, multi_point, args)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
 
 
-def read_input_file(i_fn, use_bp, use_p, options):
-    """Reads input file.
+def share_array(values):
+    """Copies an array in shared memory.
 
     Args:
-        i_fn (str): the name of the input file.
-        use_bp (bool): use physical position (bp) rather than genetic position?
-        use_p (bool): use *p values* instead of *lod score*?
-        options (argparse.Namespace): the options.
-
+        values (numpy.ndarray): the (2 dimensional) array to share.
 
     Returns:
-        pandas.DataFrame:  The array will contain the following names: ``chr``,
-                           ``pos``, ``snp`` and ``conf``.
+        tuple: the shared memory block (``None`` if shared memory is not
+               available) and a description of the shared array.
 
-    This function reads any kind of input file, as long as the file is
-    tab-separated and that it contains columns with the following headers:
+    If :py:mod:`multiprocessing.shared_memory` is not available (Python
+    before 3.8), the array itself is used as the description (and it will be
+    pickled when sent to the other processes).
 
-    ======================  ===============================================
-            Header                           Description
-    ======================  ===============================================
-    ``chr``                 The name of the chromosome
-    ``snp``                 The name of the marker
-    ``pos`` or ``cm``       The physical or genetic position (respectively)
-    ``lod`` or ``p_value``  The confidence value (either *lod score* or *p
-                            value*, respectively)
-    ======================  ===============================================
+    """
+    if shared_memory is None:
+        return None, (None, values)
 
-    Note
-    ----
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    shared = np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf)
+    shared[:] = values
+    return shm, (shm.name, values.shape, values.dtype.str)
 
-        If there is a problem while reading the input file(s),
-        a :py:class:`ProgramError` will be raised, and the program will be
-        terminated.
 
-    """
-    # Reading the data
-    csv_iterator = pd.read_csv(i_fn, sep="\t", chunksize=1e6, low_memory=False)
-    data = next(csv_iterator).dropna()
-    for chunk in csv_iterator:
-        data = data.append(chunk.dropna(), ignore_index=True)
+def block_slice(block, start, stop):
+    """Describes the columns ``start`` to ``stop`` of a shared array."""
+    if block[0] is None:
+        return (None, block[1][:, start:stop])
+    return block + (start, stop)
 
-    # Checking we have the required column
-    required_cols = {options.col_chr, options.col_name,
-                     options.col_pos if use_bp else options.col_cm,
-                     options.col_pvalue if use_p else options.col_lod}
-    same_col = required_cols & set(data.columns)
-    if same_col != required_cols:
-        raise ProgramError("{}: missing columns {}".format(
-            i_fn,
-            ", ".join(required_cols - same_col),
-        ))
 
-    # Renaming the columns
-    data = data.rename(columns={
-        options.col_chr: "chrom",
-        options.col_pos if use_bp else options.col_cm: "pos",
-        options.col_name: "snp",
-        options.col_pvalue if use_p else options.col_lod: "conf",
-    })
-    data = data[["chrom", "pos", "snp", "conf"]]
+def init_worker(args):
+    """Sets the options of a worker process.
 
-    # Encoding the chromosomes and extracting required ones
-    data["chrom"] = [encode_chr(chrom) for chrom in data.chrom]
-    data = data[~data.chrom.isin(options.exclude_chr)]
+    Args:
+        args (argparse.Namespace): the options and arguments of the program.
 
-    # If p values, we modify
-    if use_p:
-        data["conf"] = -1 * np.log10(data.conf)
+    The options (with the gene index and the contig names) are sent once to
+    each process of a pool, instead of once per task.
 
-    # Ordering and returning
-    return data.sort_values(by=["chrom", "pos"])
+    """
+    global worker_args
+    worker_args = args
 
 
-def create_manhattan_plot(twopoint, multipoint, args):
-    """Creates the manhattan plot from marker data.
+def plot_chromosome(task):
+    """Plots a single chromosome (to be used by a pool of processes).
 
     Args:
-        twopoint (pandas.DataFrame): the two point data
-                                     (``None`` if not available).
+        task (tuple): the chromosome, the description of the two point and
+                      multipoint slices and the names of the significant
+                      markers (the options are set by
+                      :py:func:`init_worker`).
+
+    """
+    chrom, blocks, sig_names = task
+    args = worker_args
+
+    # The options for this chromosome
+    args = argparse.Namespace(**vars(args))
+    args.outFile_name = "{}.{}".format(args.outFile_name,
+                                       args.contigs.full_label(chrom))
+    args.unplaced_below = None
+    if args.chrom_lengths is not None:
+        if chrom in args.chrom_lengths.index:
+            args.chrom_lengths = args.chrom_lengths.loc[[chrom]]
+        else:
+            args.chrom_lengths = None
+
+    # Reading the data from shared memory
+    data = {"twopoint": None, "multipoint": None}
+    for name, block in blocks.items():
+        shm = None
+        if block[0] is None:
+            values = block[1]
+        else:
+            shm_name, shape, dtype, start, stop = block
+            shm = shared_memory.SharedMemory(name=shm_name)
+            values = np.ndarray(shape, dtype=dtype,
+                                buffer=shm.buf)[:, start:stop]
+        try:
+            data[name] = pd.DataFrame({
+                "chrom": values[0].astype(int),
+                "pos": values[1].copy(),
+                "snp": "",
+                "conf": values[2].copy(),
+            }, columns=["chrom", "pos", "snp", "conf"])
+        finally:
+            del values
+            if shm is not None:
+                shm.close()
+
+    # Setting the name of the significant markers
+    if data["twopoint"] is not None:
+        twopoint = data["twopoint"]
+        sig_mask = twopoint.conf >= args.significant_threshold
+        twopoint.loc[sig_mask, "snp"] = sig_names
+
+    # Creating the plot (only saved, see :py:func:`new_figure`)
+    import matplotlib as mpl
+    plot = ManhattanPlot(data["twopoint"], data["multipoint"], args)
+
+    # The X axis spans the chromosome (from 0 if its length is known, or
+    # from the first marker), with a small padding
+    max_pos = plot.layout.max_pos.iloc[0]
+    min_pos = 0
+    if args.chrom_lengths is None:
+        min_pos = min(d.pos.min() for d in data.values() if d is not None)
+    padding = max((max_pos - min_pos) * CHROM_X_PADDING, 1)
+    plot.xlim = (min_pos - padding, max_pos + padding)
+    plot.create_figure(None)
+    plot.draw()
+
+    # The X axis shows the positions on the chromosome
+    plot.ax.xaxis.set_major_locator(mpl.ticker.AutoLocator())
+    plot.ax.xaxis.set_major_formatter(mpl.ticker.ScalarFormatter())
+    plot.ax.set_xlabel("{} {}".format(args.graph_x_label,
+                                      args.contigs.label(chrom)),
+                       fontsize=args.label_text_size)
+    plot.save()
+
+
+def create_tile_pyramid(twopoint, multipoint, args):
+    """Creates a multi-resolution tile pyramid of the two point markers.
+
+    Args:
+        twopoint (pandas.DataFrame): the two point data.
         multipoint (pandas.DataFrame): the multipoint data
                                        (``None`` if not available).
         args (argparse.Namespace): the options and arguments of the program.
 
-    Creates manhattan plots from two point or multipoint data. Two point
-    results are shown in a manhattan plot using points (different color for
-    each of the chromosomes). Multi point results are shown using lines.
+    The tiles are written in ``<output>_tiles/<z>/<x>/<y>.png`` (with
+    ``2^z`` by ``2^z`` tiles at zoom level ``z``), along with a
+    ``manifest.json`` file describing the zoom levels, the limits, the
+    chromosome layout (the same as the one of the plot), the tiles (with their
+    number of markers and maximal value) and the significant markers.
 
-    If both two and mutli point data are available, multi point results are
-    shown above two point data.
+    The markers are aggregated once at the finest zoom level (a single entry
+    per occupied pixel, with its marker count and maximal value), and each
+    coarser level is aggregated from the previous one. The significant markers
+    are always drawn individually. The tiles are transparent (the chromosome
+    boxes are described in the manifest) and are rendered in parallel.
 
     """
-    import matplotlib as mpl
-    if args.no_annotation:
-        mpl.use("Agg")
-    try:
-        import matplotlib.pyplot as plt
-    except ImportError:
-        raise ProgramError("Could not import matplotlib. The most common "
-                           "cause is that there is no available display, but "
-                           "annotation has been asked for... Try using the "
-                           "--no_annotation option.")
+    plot = ManhattanPlot(twopoint, multipoint, args)
+    xlim = plot.xlim
+    ylim = plot.get_ylim()
+    out_dir = args.outFile_name + "_tiles"
 
-    if args.no_annotation:
-        plt.ioff()
+    # The size of the markers (in pixels, at 72 DPI)
+    import matplotlib as mpl
+    edge = mpl.rcParams["lines.markeredgewidth"]
+    point_size = args.point_size + edge
+    significant_size = args.significant_point_size + edge
+    reach = int(np.ceil(max(point_size, significant_size) / 2))
+
+    # The non significant markers, at the finest zoom level
+    width = TILE_SIZE * 2 ** args.tile_max_zoom
+    data = twopoint[~plot.sig_mask]
+    col = np.floor((data.cum_pos.values - xlim[0]) *
+                   (width / (xlim[1] - xlim[0])))
+    row = np.floor((ylim[1] - data.conf.values) *
+                   (width / (ylim[1] - ylim[0])))
+    in_range = (col >= 0) & (col < width) & (row >= 0) & (row < width)
+    parity = data.chrom.map(plot.layout.parity).values[in_range]
+    level = aggregate_pixels(
+        col[in_range].astype(np.int64), row[in_range].astype(np.int64),
+        parity, np.ones(in_range.sum(), dtype=np.int64),
+        data.conf.values[in_range],
+    )
 
-    # The available chromosomes
-    available_chrom = []
-    if args.twopoint is not None:
-        available_chrom.append(sorted(twopoint.chrom.unique()))
-    if args.multipoint is not None:
-        available_chrom.append(sorted(multipoint.chrom.unique()))
-    if len(available_chrom) == 1:
-        available_chrom = available_chrom[0]
+    # The significant markers
+    significant = twopoint[plot.sig_mask]
+    sig_x = ((significant.cum_pos.values - xlim[0]) / (xlim[1] - xlim[0]))
+    sig_y = ((ylim[1] - significant.conf.values) / (ylim[1] - ylim[0]))
+
+    # The colors
+    colors = [np.round(np.array(mpl.colors.colorConverter.to_rgba(c)) * 255)
+              for c in plot.get_colors() + (args.significant_color, )]
+
+    # Creating the tasks (from the finest to the coarsest zoom level)
+    tasks = []
+    tiles = {}
+    for zoom in range(args.tile_max_zoom, -1, -1):
+        if zoom < args.tile_max_zoom:
+            level = aggregate_pixels(level[0] // 2, level[1] // 2, *level[2:])
+        nb_pixels = TILE_SIZE * 2 ** zoom
+        for tile, entries, sig in split_tiles(level, sig_x * nb_pixels,
+                                              sig_y * nb_pixels, reach,
+                                              2 ** zoom):
+            fn = os.path.join(out_dir, str(zoom), str(tile[0]),
+                              "{}.png".format(tile[1]))
+            tasks.append((fn, entries, sig, point_size, significant_size,
+                          colors))
+
+            # The markers having their center in the tile
+            sig_inside = ((sig[0] >= 0) & (sig[0] < TILE_SIZE) &
+                          (sig[1] >= 0) & (sig[1] < TILE_SIZE))
+            values = np.concatenate((
+                entries[4][entries[5]],
+                significant.conf.values[sig[2][sig_inside]],
+            ))
+            tiles["{}/{}/{}".format(zoom, *tile)] = {
+                "count": int(entries[3][entries[5]].sum() + sig_inside.sum()),
+                "max": float(values.max()) if len(values) else None,
+            }
+
+    # Rendering the tiles
+    logger.info("Rendering {} tiles using {} process(es)".format(
+        len(tasks), args.nb_process,
+    ))
+    if args.nb_process > 1:
+        pool = multiprocessing.Pool(processes=args.nb_process)
+        try:
+            pool.map(render_tile, tasks, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
     else:
-        if available_chrom[0] != available_chrom[1]:
-            raise ProgramError("chromosomes are not the same for twopoint and "
-                               "multipoint data")
-        available_chrom = available_chrom[0]
+        for task in tasks:
+            render_tile(task)
+
+    # The manifest
+    manifest = {
+        "tile_size": TILE_SIZE,
+        "min_zoom": 0,
+        "max_zoom": args.tile_max_zoom,
+        "url": "{z}/{x}/{y}.png",
+        "xlim": list(xlim),
+        "ylim": list(ylim),
+        "use_pvalues": args.use_pvalues_flag,
+        "significant_threshold": args.significant_threshold,
+        "chromosome_box_color": args.chromosome_box_color,
+        "chromosomes": [
+            {"chrom": int(chrom), "label": chrom_layout.label,
+             "start": float(chrom_layout.start),
+             "xmin": float(chrom_layout.xmin),
+             "xmax": float(chrom_layout.xmax),
+             "tick": float(chrom_layout.tick),
+             "box": bool(chrom_layout.parity == 1)}
+            for chrom, chrom_layout in plot.layout.iterrows()
+        ],
+        "tiles": tiles,
+        "significant": [
+            {"snp": m.snp, "chrom": int(m.chrom), "pos": float(m.pos),
+             "x": float(m.cum_pos), "conf": float(m.conf)}
+            for m_index, m in significant.iterrows()
+        ],
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as o_file:
+        json.dump(manifest, o_file, indent=1)
+
+
+def aggregate_pixels(col, row, parity, count, maximum):
+    """Aggregates the markers falling in the same pixel.
 
-    # Creating the figure
-    figure = None
-    figure = plt.figure(figsize=(args.graph_width, args.graph_height),
-                        frameon=True)
+    Args:
+        col (numpy.ndarray): the pixel column of the entries.
+        row (numpy.ndarray): the pixel row of the entries.
+        parity (numpy.ndarray): the parity of the chromosome of the entries.
+        count (numpy.ndarray): the number of markers of the entries.
+        maximum (numpy.ndarray): the maximal value of the entries.
 
-    # Getting the maximum and minimum of the confidence value
-    conf_min = [0.0]
-    conf_max = []
-    if args.twopoint is not None:
-        conf_min.append(twopoint.conf.min())
-        conf_max.append(twopoint.conf.max())
-    if args.multipoint is not None:
-        conf_min.append(multipoint.conf.min())
-        conf_max.append(multipoint.conf.max())
-    conf_min = min(conf_min)
-    conf_max = max(conf_max)
-    if args.max_ylim is not None:
-        conf_max = args.max_ylim
-    if args.min_ylim is not None:
-        conf_min = args.min_ylim
-    if args.no_negative_values or args.use_pvalues_flag:
-        conf_min = 0.0
-
-    # The chromosome spacing
-    chrom_spacing = 25.0
-    if args.phys_pos_flag:
-        chrom_spacing = 25000000
-
-    # Creating the ax and modify it
-    ax = figure.add_subplot(111)
-    ax.xaxis.set_ticks_position("none")
-    ax.yaxis.set_ticks_position("left")
-    ax.set_ylabel("LOD")
-    ax.spines["top"].set_visible(False)
-    ax.spines["right"].set_visible(False)
-    ax.spines["bottom"].set_visible(False)
-    ax.set_xticks([])
-    ax.set_xticklabels([])
-    if args.use_pvalues_flag:
-        ax.set_ylabel(r'$-\log_{10}$ (p value)', fontsize=args.label_text_size)
-    else:
-        ax.set_ylabel(args.graph_y_label, fontsize=args.label_text_size)
-    ax.set_xlabel(args.graph_x_label, fontsize=args.label_text_size)
-    ax.set_title(args.graph_title, fontsize=16, weight="bold")
-
-    # Now plotting for each of the chromosome
-    starting_pos = 0
-    annots = []
-    ticks = []
-    for i, chrom in enumerate(available_chrom):
-        chrom_twopoint = None
-        chr_multipoint = None
-        max_pos = []
-        if args.twopoint is not None:
-            chrom_twopoint = twopoint[twopoint.chrom == chrom]
-            max_pos.append(chrom_twopoint.pos.max())
-        if args.multipoint is not None:
-            chr_multipoint = multipoint[multipoint.chrom == chrom]
-            max_pos.append(chr_multipoint.pos.max())
-        max_pos = max(max_pos)
-
-        # The color of the points
-        color = args.even_chromosome_color
-        if i % 2 == 0:
-            color = args.odd_chromosome_color
-        multipoint_color = color
-
-        # The box
-        xmin = starting_pos - (chrom_spacing / 2)
-        xmax = max_pos + starting_pos + (chrom_spacing / 2)
-        if i % 2 == 1:
-            ax.axvspan(xmin=xmin, xmax=xmax, color=args.chromosome_box_color)
-
-        # The chromosome label
-        ticks.append((xmin + xmax) / 2)
-
-        # Plotting the twopoint
-        if args.twopoint is not None:
-            ax.plot(chrom_twopoint.pos + starting_pos, chrom_twopoint.conf,
-                    marker="o", ms=args.point_size, mfc=color, mec=color,
-                    ls="None")
-            multipoint_color = args.multipoint_color
-
-        # Plotting the multipoint
-        if args.multipoint is not None:
-            ax.plot(chr_multipoint.pos + starting_pos, chr_multipoint.conf,
-                    ls="-", color=multipoint_color, lw=1.2)
-
-        # Plotting the abline
-        for abline_position in args.abline:
-            ax.axhline(y=abline_position, color="black", ls="--", lw=1.2)
-        if conf_min < 0:
-            ax.axhline(y=0, color="black", ls="-", lw=1.2)
-
-        # Plotting the significant markers
-        if args.twopoint is not None:
-            sig_mask = chrom_twopoint.conf >= args.significant_threshold
-            ax.plot(chrom_twopoint.pos[sig_mask] + starting_pos,
-                    chrom_twopoint.conf[sig_mask], marker="o", ls="None",
-                    ms=args.significant_point_size, mfc=args.significant_color,
-                    mec=args.significant_color)
-
-            # If we want annotation
-            if not args.no_annotation:
-                for m_index, m in chrom_twopoint[sig_mask].iterrows():
-                    # The confidence to write
-                    the_conf = "{:.3f}".format(m.conf)
-                    if args.use_pvalues_flag:
-                        the_conf = str(10 ** (-1 * m.conf))
-
-                    # The label of the annotation
-                    label = "\n".join([m.snp, the_conf])
-
-                    annot = ax.annotate(
-                        label,
-                        xy=(m.pos + starting_pos, m.conf),
-                        xycoords="data",
-                        size=10,
-                        xytext=(m.pos + starting_pos, conf_max),
-                        va="center",
-                        bbox=dict(boxstyle="round", fc="white", ec="black"),
-                        textcoords="data",
-                        arrowprops=dict(arrowstyle="->", shrinkA=6, shrinkB=5),
-                    )
-                    annots.append(annot)
-
-        # Changing the starting point for the next chromosome
-        starting_pos = max_pos + starting_pos + chrom_spacing
+    Returns:
+        tuple: the column, row, parity, count and maximum of the entries,
+               with a single entry per pixel and parity.
 
-    # Make the annotation draggable
-    drs = []
-    for annot in annots:
-        dr = DraggableAnnotation(annot)
-        dr.connect()
-        drs.append(dr)
+    """
+    keys = np.vstack((col, row, parity))
+    if keys.shape[1] == 0:
+        return col, row, parity, count, maximum
+
+    order = np.lexsort(keys[::-1])
+    keys = keys[:, order]
+    starts = np.concatenate((
+        [0], np.flatnonzero((np.diff(keys, axis=1) != 0).any(axis=0)) + 1,
+    ))
+    return (
+        keys[0, starts], keys[1, starts], keys[2, starts],
+        np.add.reduceat(count[order], starts),
+        np.maximum.reduceat(maximum[order], starts),
+    )
 
-    # Setting the limits
-    padding = 0.39
-    if args.no_y_padding:
-        padding = 0
-    ax.set_ylim(conf_min - padding, conf_max + padding)
-    ax.set_xlim(0 - chrom_spacing, starting_pos + chrom_spacing)
 
-    # Putting the xticklabels
-    ax.set_xticks(ticks)
-    ax.set_xticklabels(available_chrom)
+def split_tiles(level, sig_col, sig_row, reach, nb_tiles):
+    """Splits the entries of a zoom level into tiles.
 
-    for tick in ax.yaxis.get_major_ticks():
-        tick.label.set_fontsize(args.axis_text_size)
+    Args:
+        level (tuple): the aggregated entries (see
+                       :py:func:`aggregate_pixels`).
+        sig_col (numpy.ndarray): the pixel column of the significant markers.
+        sig_row (numpy.ndarray): the pixel row of the significant markers.
+        reach (int): the number of pixels a marker spans around its center.
+        nb_tiles (int): the number of tiles in each dimension.
 
-    for tick in ax.xaxis.get_major_ticks():
-        tick.label.set_fontsize(args.chr_text_size)
+    Returns:
+        generator: the tile (x and y), its entries (with coordinates relative
+                   to the tile, and a mask of the entries inside the tile)
+                   and its significant markers (coordinates and indexes).
 
-    # Saving or plotting the figure
-    mpl.rcParams['savefig.dpi'] = args.dpi
-    mpl.rcParams['ps.papersize'] = "auto"
-    mpl.rcParams['savefig.orientation'] = "landscape"
+    Markers near the border of a tile are also included in the neighbouring
+    tiles, so that they are not cut.
 
-    if args.no_annotation or (args.twopoint is None):
-        # Annotation is for two-point only, se we save the figure
-        plt.savefig(args.outFile_name + "." + args.graph_format,
-                    bbox_inches="tight")
-        if args.graph_format != "png":
-            plt.savefig(args.outFile_name + ".png", bbox_inches="tight")
-        if args.web:
-            print(args.outFile_name + ".png")
+    """
+    col, row, parity, count, maximum = level
+
+    # The entries (and their copies in the neighbouring tiles)
+    tiles = []
+    inside = []
+    indexes = []
+    for shift_x in (-1, 0, 1):
+        for shift_y in (-1, 0, 1):
+            tile_x = (col + shift_x * reach) // TILE_SIZE
+            tile_y = (row + shift_y * reach) // TILE_SIZE
+            mask = ((tile_x != col // TILE_SIZE) |
+                    (tile_y != row // TILE_SIZE) |
+                    ((shift_x == 0) & (shift_y == 0)))
+            tiles.append(np.vstack((tile_x[mask], tile_y[mask])))
+            inside.append(np.repeat((shift_x == 0) & (shift_y == 0),
+                                    mask.sum()))
+            indexes.append(np.flatnonzero(mask))
+    tiles = np.hstack(tiles)
+    inside = np.concatenate(inside)
+    indexes = np.concatenate(indexes)
+
+    # The significant markers (and their copies)
+    sig_tiles = []
+    sig_indexes = []
+    for shift_x in (-reach, 0, reach):
+        for shift_y in (-reach, 0, reach):
+            sig_tiles.append(np.vstack((
+                np.floor((sig_col + shift_x) / TILE_SIZE).astype(np.int64),
+                np.floor((sig_row + shift_y) / TILE_SIZE).astype(np.int64),
+            )))
+            sig_indexes.append(np.arange(len(sig_col)))
+    sig_tiles = np.hstack(sig_tiles)
+    sig_indexes = np.concatenate(sig_indexes)
+
+    # Grouping by tile
+    all_tiles = np.unique(np.hstack((tiles, sig_tiles)), axis=1)
+    order = np.lexsort(tiles[::-1])
+    tiles = tiles[:, order]
+    inside = inside[order]
+    indexes = indexes[order]
+    for tile_x, tile_y in all_tiles.T:
+        if not (0 <= tile_x < nb_tiles and 0 <= tile_y < nb_tiles):
+            continue
+
+        # The entries of this tile
+        start = np.searchsorted(tiles[0], tile_x, side="left")
+        stop = np.searchsorted(tiles[0], tile_x, side="right")
+        start += np.searchsorted(tiles[1, start:stop], tile_y, side="left")
+        stop = start + np.searchsorted(tiles[1, start:stop], tile_y,
+                                       side="right")
+        selected = indexes[start:stop]
+        entries = (col[selected] - tile_x * TILE_SIZE,
+                   row[selected] - tile_y * TILE_SIZE, parity[selected],
+                   count[selected], maximum[selected], inside[start:stop])
+
+        # The significant markers of this tile
+        sig_mask = (sig_tiles[0] == tile_x) & (sig_tiles[1] == tile_y)
+        sig_selected = np.unique(sig_indexes[sig_mask])
+        sig = (sig_col[sig_selected] - tile_x * TILE_SIZE,
+               sig_row[sig_selected] - tile_y * TILE_SIZE, sig_selected)
+
+        yield (tile_x, tile_y), entries, sig
+
+
+def render_tile(task):
+    """Renders a single tile (to be used by a pool of processes).
+
+    Args:
+        task (tuple): the name of the file, the entries and the significant
+                      markers of the tile, the size of the markers and the
+                      colors.
+
+    """
+    fn, entries, sig, point_size, significant_size, colors = task
+    import matplotlib.image as mpimg
+
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    limits = (0, TILE_SIZE)
+
+    # The entries (one color per parity), at the center of their pixel
+    col, row, parity = entries[:3]
+    for i in range(2):
+        mask = parity == i
+        rasterize_points(image, col[mask] + 0.5, TILE_SIZE - row[mask] - 0.5,
+                         limits, limits, point_size, colors[i])
+
+    # The significant markers
+    rasterize_points(image, sig[0], TILE_SIZE - sig[1], limits, limits,
+                     significant_size, colors[2])
+
+    dirname = os.path.dirname(fn)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # Another process might have created it
+            if not os.path.isdir(dirname):
+                raise
+    mpimg.imsave(fn, image)
+
+
+def decimate_points(x, y, xlim, ylim, width, height):
+    """Decimates markers for display (a single marker per pixel).
+
+    Args:
+        x (numpy.ndarray): the X coordinates of the markers.
+        y (numpy.ndarray): the Y coordinates of the markers.
+        xlim (tuple): the limits of the X axis.
+        ylim (tuple): the limits of the Y axis.
+        width (int): the width of the axe (in pixels).
+        height (int): the height of the axe (in pixels).
+
+    Returns:
+        numpy.ndarray: the (sorted) indexes of the markers to keep.
+
+    Since markers of the same color are at least one pixel wide, a marker
+    falling in the same pixel as a previous one is hidden by it (up to a
+    pixel). Only the first marker of each pixel is kept. The markers outside
+    of the limits are all kept.
 
+    """
+    col = np.floor((x - xlim[0]) * (width / (xlim[1] - xlim[0])))
+    row = np.floor((ylim[1] - y) * (height / (ylim[1] - ylim[0])))
+    in_range = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+    indexes = np.flatnonzero(in_range)
+    pixel = (row[in_range] * width + col[in_range]).astype(np.int64)
+
+    # The first marker of each pixel
+    _, first = np.unique(pixel, return_index=True)
+    kept = indexes[first]
+
+    return np.sort(np.concatenate((kept, np.flatnonzero(~in_range))))
+
+
+def write_html_plot(plot, fn):
+    """Writes a self-contained interactive HTML plot.
+
+    Args:
+        plot (ManhattanPlot): the plot (with its data and layout).
+        fn (str): the name of the HTML file.
+
+    The two point markers are decimated (see :py:func:`decimate_points`) at
+    the resolution of the canvas, and embedded as base64 encoded packed
+    arrays (``uint8`` chromosome index, ``float32`` cumulative position and
+    ``float32`` value). The significant markers are always kept. The
+    multipoint lines are simplified as in the static output (see
+    :py:func:`simplify_line`). Without two point data, the vertices of the
+    lines are embedded (but not drawn) for the mouse lookup. A small
+    canvas renderer shows the name and the p value (or LOD score) of the
+    marker under the mouse (and the nearest gene of the significant
+    markers).
+
+    """
+    args = plot.args
+    width = int(round(args.graph_width * HTML_DPI))
+    height = int(round(args.graph_height * HTML_DPI))
+    ylim = plot.get_ylim()
+
+    # The markers to embed
+    twopoint = plot.twopoint
+    if twopoint is None:
+        twopoint = plot.multipoint
+        sig_mask = np.zeros(len(twopoint), dtype=bool)
     else:
-        # There is some two-point data and annotation is asked, se we show
-        # the figure
-        plt.show()
+        sig_mask = plot.sig_mask
+    kept = decimate_points(twopoint.cum_pos.values, twopoint.conf.values,
+                           plot.xlim, ylim, width, height)
+    kept = np.union1d(kept, np.flatnonzero(sig_mask))
+    data = twopoint.iloc[kept]
+
+    # The nearest gene of the significant markers (by embedded index)
+    genes = {}
+    if plot.sig_genes is not None:
+        sig_index = np.searchsorted(kept, np.flatnonzero(sig_mask))
+        genes = {str(i): label for i, label in zip(sig_index, plot.sig_genes)
+                 if label}
+    chrom_index = pd.Series(np.arange(len(plot.layout)),
+                            index=plot.layout.index)
+    chrom_bytes = 1 if len(plot.layout) <= 0xff else \
+        2 if len(plot.layout) <= 0xffff else 4
+
+    # The boxes and the tick labels (only those which don't overlap)
+    bins = get_layout_bins(plot.layout)
+    kept_ticks = thin_ticks(bins.tick.values, bins.label.values, plot.xlim,
+                            width, 12)
+
+    # The multipoint lines (simplified as in the static output, with one line
+    # per chromosome)
+    lines = []
+    if plot.multipoint is not None:
+        multipoint = plot.multipoint
+        keep = simplify_line(multipoint.cum_pos.values,
+                             multipoint.conf.values, plot.xlim,
+                             width * LINE_COLUMNS_PER_PIXEL)
+        colors = plot.get_colors()
+        for chrom, chrom_data in multipoint.iloc[keep].groupby("chrom"):
+            color = args.multipoint_color
+            if plot.twopoint is None:
+                color = colors[plot.layout.parity[chrom]]
+            lines.append([chrom_data.cum_pos.values.tolist(),
+                          chrom_data.conf.values.tolist(), color])
+
+    # The configuration of the renderer
+    import matplotlib as mpl
+    edge = mpl.rcParams["lines.markeredgewidth"]
+    config = {
+        "width": width,
+        "height": height,
+        "title": args.graph_title,
+        "xlabel": args.graph_x_label,
+        "ylabel": ("-log10 (p value)" if args.use_pvalues_flag
+                   else args.graph_y_label),
+        "use_pvalues": args.use_pvalues_flag,
+        "xlim": list(plot.xlim),
+        "ylim": list(ylim),
+        "chromosomes": [
+            {"label": args.contigs.full_label(chrom), "parity": int(parity)}
+            for chrom, parity in zip(plot.layout.index, plot.layout.parity)
+        ],
+        "chrom_bytes": chrom_bytes,
+        "boxes": [[float(xmin), float(xmax)] for xmin, xmax in zip(
+            bins.xmin[bins.parity == 1], bins.xmax[bins.parity == 1],
+        )],
+        "ticks": [[float(tick), label] for tick, label in zip(
+            bins.tick.values[kept_ticks], bins.label.values[kept_ticks],
+        )],
+        "colors": list(plot.get_colors()),
+        "points": plot.twopoint is not None,
+        "box_color": args.chromosome_box_color,
+        "significant_color": args.significant_color,
+        "radius": (args.point_size + edge) / 2 * HTML_DPI / 72,
+        "significant_radius": ((args.significant_point_size + edge) / 2 *
+                               HTML_DPI / 72),
+        "threshold": (args.significant_threshold if plot.twopoint is not None
+                      else None),
+        "ablines": list(args.abline),
+        "zero_line": bool(plot.conf_min < 0),
+        "lines": lines,
+        "names": [str(name) for name in data.snp.values],
+        "genes": genes,
+    }
+
+    # The packed arrays
+    arrays = {
+        "chrom": data.chrom.map(chrom_index).values.astype(
+            "<u{}".format(chrom_bytes),
+        ),
+        "pos": data.cum_pos.values.astype("<f4"),
+        "conf": data.conf.values.astype("<f4"),
+    }
+    arrays = {
+        name: base64.b64encode(values.tobytes()).decode("ascii")
+        for name, values in arrays.items()
+    }
+
+    with open(fn, "w") as o_file:
+        o_file.write(string.Template(HTML_TEMPLATE).substitute(
+            title=escape_html(args.graph_title or "Manhattan plot"),
+            config=json.dumps(config).replace("</", "<\\/"),
+            **arrays
+        ))
+
+
+def escape_html(text):
+    """Escapes the special HTML characters of a text."""
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), (">", "&gt;")):
+        text = text.replace(char, entity)
+    return text
+
+
+# The template of the HTML output (see :py:func:`write_html_plot`)
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+body { font-family: sans-serif; margin: 10px; }
+#plot { position: relative; display: inline-block; }
+#tooltip { position: absolute; display: none; pointer-events: none;
+           background: white; border: 1px solid black; border-radius: 4px;
+           padding: 2px 6px; font-size: 12px; white-space: pre; }
+</style>
+</head>
+<body>
+<div id="plot"><canvas id="canvas"></canvas><div id="tooltip"></div></div>
+<script>
+var config = $config;
+
+function decode(data, type) {
+  var binary = atob(data);
+  var bytes = new Uint8Array(binary.length);
+  for (var i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  return new type(bytes.buffer);
+}
+
+var chrom = decode("$chrom", {1: Uint8Array, 2: Uint16Array,
+                              4: Uint32Array}[config.chrom_bytes]);
+var pos = decode("$pos", Float32Array);
+var conf = decode("$conf", Float32Array);
+
+var margin = {left: 70, right: 20, top: 40, bottom: 55};
+var width = config.width, height = config.height;
+var plotWidth = width - margin.left - margin.right;
+var plotHeight = height - margin.top - margin.bottom;
+
+function toX(x) {
+  return margin.left + (x - config.xlim[0]) /
+         (config.xlim[1] - config.xlim[0]) * plotWidth;
+}
+
+function toY(y) {
+  return margin.top + (config.ylim[1] - y) /
+         (config.ylim[1] - config.ylim[0]) * plotHeight;
+}
+
+var canvas = document.getElementById("canvas");
+var ratio = window.devicePixelRatio || 1;
+canvas.width = width * ratio;
+canvas.height = height * ratio;
+canvas.style.width = width + "px";
+canvas.style.height = height + "px";
+var ctx = canvas.getContext("2d");
+ctx.scale(ratio, ratio);
+
+function isSignificant(i) {
+  return config.threshold !== null && conf[i] >= config.threshold;
+}
+
+function drawPoints(significant, color, radius, parity) {
+  ctx.fillStyle = color;
+  ctx.beginPath();
+  for (var i = 0; i < pos.length; i++) {
+    if (isSignificant(i) !== significant) continue;
+    if (parity !== null && config.chromosomes[chrom[i]].parity !== parity) {
+      continue;
+    }
+    var x = toX(pos[i]), y = toY(conf[i]);
+    ctx.moveTo(x + radius, y);
+    ctx.arc(x, y, radius, 0, 2 * Math.PI);
+  }
+  ctx.fill();
+}
+
+function draw() {
+  ctx.fillStyle = "white";
+  ctx.fillRect(0, 0, width, height);
+
+  // The title and the labels
+  ctx.fillStyle = "black";
+  ctx.textAlign = "center";
+  ctx.font = "bold 16px sans-serif";
+  ctx.fillText(config.title, margin.left + plotWidth / 2, 25);
+  ctx.font = "12px sans-serif";
+  ctx.fillText(config.xlabel, margin.left + plotWidth / 2, height - 10);
+  ctx.save();
+  ctx.translate(20, margin.top + plotHeight / 2);
+  ctx.rotate(-Math.PI / 2);
+  ctx.fillText(config.ylabel, 0, 0);
+  ctx.restore();
+
+  // The chromosome boxes and labels
+  ctx.save();
+  ctx.beginPath();
+  ctx.rect(margin.left, margin.top, plotWidth, plotHeight);
+  ctx.clip();
+  ctx.fillStyle = config.box_color;
+  config.boxes.forEach(function(box) {
+    ctx.fillRect(toX(box[0]), margin.top, toX(box[1]) - toX(box[0]),
+                 plotHeight);
+  });
+
+  // The markers (not the multipoint vertices) and the lines
+  if (config.points) {
+    drawPoints(false, config.colors[0], config.radius, 0);
+    drawPoints(false, config.colors[1], config.radius, 1);
+  }
+  ctx.lineWidth = 1.2;
+  config.lines.forEach(function(line) {
+    ctx.strokeStyle = line[2];
+    ctx.beginPath();
+    for (var i = 0; i < line[0].length; i++) {
+      ctx.lineTo(toX(line[0][i]), toY(line[1][i]));
+    }
+    ctx.stroke();
+  });
+
+  // The ablines
+  ctx.strokeStyle = "black";
+  config.ablines.forEach(function(y) {
+    ctx.setLineDash([5, 3]);
+    ctx.beginPath();
+    ctx.moveTo(margin.left, toY(y));
+    ctx.lineTo(margin.left + plotWidth, toY(y));
+    ctx.stroke();
+  });
+  ctx.setLineDash([]);
+  if (config.zero_line) {
+    ctx.beginPath();
+    ctx.moveTo(margin.left, toY(0));
+    ctx.lineTo(margin.left + plotWidth, toY(0));
+    ctx.stroke();
+  }
+  drawPoints(true, config.significant_color, config.significant_radius,
+             null);
+  ctx.restore();
+
+  // The axis
+  ctx.fillStyle = "black";
+  ctx.strokeStyle = "black";
+  ctx.lineWidth = 1;
+  ctx.beginPath();
+  ctx.moveTo(margin.left, margin.top);
+  ctx.lineTo(margin.left, margin.top + plotHeight);
+  ctx.stroke();
+  ctx.textAlign = "right";
+  ctx.textBaseline = "middle";
+  var step = Math.pow(10, Math.floor(Math.log10(
+    (config.ylim[1] - config.ylim[0]) / 2)));
+  if ((config.ylim[1] - config.ylim[0]) / step > 10) step *= 2;
+  for (var y = Math.ceil(config.ylim[0] / step) * step; y <= config.ylim[1];
+       y += step) {
+    ctx.beginPath();
+    ctx.moveTo(margin.left - 5, toY(y));
+    ctx.lineTo(margin.left, toY(y));
+    ctx.stroke();
+    ctx.fillText(+y.toFixed(6), margin.left - 8, toY(y));
+  }
+  ctx.textAlign = "center";
+  ctx.textBaseline = "top";
+  config.ticks.forEach(function(tick) {
+    ctx.fillText(tick[1], toX(tick[0]), margin.top + plotHeight + 5);
+  });
+}
+
+// The index of the markers by pixel (for the hover lookup)
+var grid = {};
+for (var i = 0; i < pos.length; i++) {
+  var key = Math.round(toX(pos[i])) + "," + Math.round(toY(conf[i]));
+  if (!(key in grid) || isSignificant(i)) grid[key] = i;
+}
+
+var tooltip = document.getElementById("tooltip");
+canvas.addEventListener("mousemove", function(event) {
+  var rect = canvas.getBoundingClientRect();
+  var mx = event.clientX - rect.left, my = event.clientY - rect.top;
+  var best = -1, bestDistance = Infinity, reach = 4;
+  for (var dx = -reach; dx <= reach; dx++) {
+    for (var dy = -reach; dy <= reach; dy++) {
+      var key = (Math.round(mx) + dx) + "," + (Math.round(my) + dy);
+      if (key in grid && dx * dx + dy * dy < bestDistance) {
+        best = grid[key];
+        bestDistance = dx * dx + dy * dy;
+      }
+    }
+  }
+  if (best < 0) {
+    tooltip.style.display = "none";
+    return;
+  }
+  var value = config.use_pvalues ? "p = " + Math.pow(10, -conf[best])
+                                         .toExponential(3)
+                                 : "LOD = " + conf[best].toFixed(3);
+  tooltip.textContent = config.names[best] + "\\n" +
+                        config.chromosomes[chrom[best]].label + "\\n" + value +
+                        (config.genes[best] ? "\\n" + config.genes[best] : "");
+  tooltip.style.left = (mx + 12) + "px";
+  tooltip.style.top = (my + 12) + "px";
+  tooltip.style.display = "block";
+});
+canvas.addEventListener("mouseleave", function() {
+  tooltip.style.display = "none";
+});
+
+draw();
+</script>
+</body>
+</html>
+"""
 
 
 def encode_chr(chromosome):
@@ -524,6 +3472,32 @@ def encode_chr(chromosome):
         raise ProgramError(msg)
 
 
+def encode_known_chr(chromosome):
+    """Encodes a chromosome in integer format, if possible.
+
+    Args:
+        chromosome (str): the chromosome to encode in integer.
+
+    Returns:
+        int: the chromosome encoded in integer (see :py:func:`encode_chr`),
+             or ``None`` if it is not a known chromosome.
+
+    A ``chr`` prefix is allowed (*e.g.* ``chr1``, ``chrX`` or ``chrM``).
+
+    """
+    names = [chromosome]
+    if str(chromosome).lower().startswith("chr"):
+        names.append(str(chromosome)[3:])
+    if names[-1] in ("M", "m"):
+        names.append("MT")
+    for name in names:
+        try:
+            return encode_chr(name)
+        except ProgramError:
+            pass
+    return None
+
+
 def check_args(args):
     """Checks the arguments and options.
 
@@ -542,6 +3516,20 @@ def check_args(args):
                   "(%f)" % (args.max_ylim, args.min_ylim)
             raise ProgramError(msg)
 
+    # The number of processes
+    if args.nb_process < 1:
+        msg = "%d: invalid number of processes" % args.nb_process
+        raise ProgramError(msg)
+
+    # The tile pyramid
+    if args.tiles:
+        if args.twopoint is None:
+            raise ProgramError("The tile pyramid requires two-point data "
+                               "(--twopoint)")
+        if args.tile_max_zoom < 0:
+            msg = "%d: invalid zoom level" % args.tile_max_zoom
+            raise ProgramError(msg)
+
     # The type of graph
     if (args.twopoint is None) and (args.multipoint is None):
         msg = "Meed to specify at least one graph type (option -t or -m)"
@@ -565,11 +3553,65 @@ def check_args(args):
         msg = "%s: not a valid LOD score (must be float)" % args.abline
         raise ProgramError(msg)
 
+    # The confidence value columns (one plot per column)
+    args.col_pvalue = args.col_pvalue.split(",")
+    args.col_lod = args.col_lod.split(",")
+    conf_cols = get_conf_columns(args)
+    if len(set(conf_cols)) != len(conf_cols):
+        msg = "%s: duplicated columns" % ",".join(conf_cols)
+        raise ProgramError(msg)
+    if args.watch and len(conf_cols) > 1:
+        raise ProgramError("Watch mode requires a single confidence value "
+                           "column")
+
+    # The QQ plot
+    if args.qq:
+        if not args.use_pvalues_flag or args.twopoint is None:
+            raise ProgramError("The QQ plot requires two-point p values "
+                               "(--twopoint and --use-pvalues)")
+        if args.watch:
+            raise ProgramError("The QQ plot is not available in watch mode")
+
+    # The codes and the plotting order of the chromosomes
+    order_names = None
+    if args.chr_order not in ("natural", "input"):
+        if not os.path.isfile(args.chr_order):
+            msg = "%s: not an order (natural, input) nor a file" % \
+                  args.chr_order
+            raise ProgramError(msg)
+        with open(args.chr_order, "r") as i_file:
+            order_names = [line.strip() for line in i_file if line.strip()]
+    args.contigs = ContigNames(
+        "natural" if args.chr_order == "natural" else "input", order_names,
+    )
+    if args.unplaced_below is not None and args.unplaced_below <= 0:
+        msg = "%f: invalid contig length" % args.unplaced_below
+        raise ProgramError(msg)
+
     # Checking if there are some chromosome to exclude
     if args.exclude_chr is None:
         args.exclude_chr = set()
     else:
-        args.exclude_chr = {encode_chr(i) for i in args.exclude_chr.split(",")}
+        args.exclude_chr = {args.contigs.encode_name(i, rank=False)
+                            for i in args.exclude_chr.split(",")}
+
+    # The gene annotation (for the labels)
+    args.gene_index = None
+    if args.genes is not None:
+        if not args.phys_pos_flag:
+            raise ProgramError("The gene labels require physical positions "
+                               "(--bp)")
+        if not os.path.isfile(args.genes):
+            msg = "%s: no such file or directory" % args.genes
+            raise ProgramError(msg)
+        args.gene_index = GeneIndex.load(args.genes)
+
+    # The chromosome lengths (to fix the layout)
+    args.chrom_lengths = None
+    if args.genome_build is not None:
+        lengths = read_chrom_lengths(args.genome_build, args.phys_pos_flag,
+                                     args.contigs)
+        args.chrom_lengths = lengths[~lengths.index.isin(args.exclude_chr)]
 
     # Checking the graph title for unicode (python2)
     try:
@@ -580,9 +3622,13 @@ def check_args(args):
         pass
 
 
-def parse_args():
+def parse_args(argv=None):
     """Parses the command line options and arguments.
 
+    Args:
+        argv (list): the arguments to parse (``None`` to parse
+                     :py:data:`sys.argv`).
+
     Returns:
     argparse.Namespace: An object created by the :py:mod:`argparse` module. It
                         contains the values of the different options.
@@ -596,13 +3642,35 @@ def parse_args():
                                            linkage
     ``--output``                  String   The name of the ouput *file*
     ``--format``                  String   The format of the plot (ps, pdf
-                                           png)
+                                           png, eps, html)
     ``--dpi``                     Int      The quality of the output (in dpi)
+    ``--watch``                   Boolean  Re-render the plot each time the
+                                           options or the data change
+    ``--per-chromosome``          Boolean  Also create one plot per
+                                           chromosome
+    ``--nb-process``              Int      The number of processes for the
+                                           per chromosome plots, the tiles
+                                           and the confidence value columns
+    ``--tiles``                   Boolean  Also create a tile pyramid for web
+                                           viewers
+    ``--tile-max-zoom``           Int      The maximal zoom level of the tile
+                                           pyramid
+    ``--qq``                      Boolean  Also create a QQ plot (with the
+                                           genomic inflation factor)
     ``--bp``                      Boolean  Use physical positions (bp) instead
                                            of genetic positions (cM).
     ``--use-pvalues``             Boolean  Use pvalues instead of LOD score
                                            requires to compute
                                            :math:`-log_{10}(pvalue)`
+    ``--min-conf``                Float    Only plot the markers with a value
+                                           of at least *value*
+    ``--genome-build``            String   The genome build (or a *file*)
+                                           giving the chromosome lengths
+    ``--chr-order``               String   The plotting order of the
+                                           chromosomes (natural, input or a
+                                           *file*)
+    ``--unplaced-below``          Float    Merge the contigs shorter than
+                                           *value* in a single bin
     ``--no-negative-values``      Boolean  Do not plot negative values
     ``--max-ylim``                Float    The maximal Y *value* to plot
     ``--min-ylim``                Float    The minimal Y *value* to plot
@@ -616,6 +3684,10 @@ def parse_args():
     ``--point-size``              Float    The *size* of each points.
     ``--significant-point-size``  Float    The *size* of each significant
                                            points
+    ``--point-renderer``          String   The renderer for the points
+                                           (matplotlib, numpy or density)
+    ``--decimate-points``         Boolean  Only draw a single point per
+                                           pixel (matplotlib renderer)
     ``--abline``                  String   The y *value* where to create a
                                            horizontal line, separated by a
                                            comma
@@ -623,6 +3695,9 @@ def parse_args():
                                            linkage
     ``--no-annotation``           Boolean  Do not draw annotation (SNP names)
                                            for the significant results
+    ``--genes``                   File     Label the significant markers with
+                                           their nearest gene (GTF or BED
+                                           *file*)
     ``--chromosome-box-color``    String   The *color* for the box surrounding
                                            even chromosome numbers
     ``--even-chromosome-color``   String   The *color* for the box surrounding
@@ -646,6 +3721,9 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description="This script produces nice Manhattan plots for either "
                     "linkage or GWAS results.",
+        epilog="Options can also be read from a file (one per line) using "
+               "'@FILE'.",
+        fromfile_prefix_chars="@",
     )
 
     # Adding the version option
@@ -665,13 +3743,15 @@ def parse_args():
     # The input file (for two point)
     group.add_argument(
         "--twopoint", type=str, metavar="FILE",
-        help="The input FILE for two-point linkage.",
+        help="The input FILE for two-point linkage (tab-separated, or "
+             "Parquet/Arrow depending on the extension).",
     )
 
     # The input file (for multipoint)
     group.add_argument(
         "--multipoint", type=str, metavar="FILE",
-        help="The input FILE for multipoint linkage.",
+        help="The input FILE for multipoint linkage (tab-separated, or "
+             "Parquet/Arrow depending on the extension).",
     )
 
     # The column options
@@ -712,6 +3792,7 @@ def parse_args():
     group.add_argument(
         "--col-pvalue", type=str, metavar="COL", default="p_value",
         help="The name of the column containing the marker p values "
+             "(many columns separated by a coma, one plot per column) "
              "[Default: %(default)s]",
     )
 
@@ -719,6 +3800,7 @@ def parse_args():
     group.add_argument(
         "--col-lod", type=str, metavar="COL", default="lod",
         help="The name of the column containing the marker LOD score "
+             "(many columns separated by a coma, one plot per column) "
              "[Default: %(default)s]",
     )
 
@@ -736,7 +3818,7 @@ def parse_args():
     )
 
     # The type of the graph (png, ps or pdf)
-    format_choices = ["ps", "pdf", "png", "eps"]
+    format_choices = ["ps", "pdf", "png", "eps", "html"]
     group.add_argument(
         "-f", "--format", dest="graph_format", type=str, default="png",
         metavar="FORMAT", choices=format_choices,
@@ -755,6 +3837,45 @@ def parse_args():
         help="The quality of the output (in dpi) [Default: %(default)d].",
     )
 
+    group.add_argument(
+        "--watch", action="store_true",
+        help="Keep the data in memory and re-render the plot each time an "
+             "options file (@FILE) or an input file is modified.",
+    )
+
+    group.add_argument(
+        "--per-chromosome", action="store_true",
+        help="Also create one zoomed plot per chromosome "
+             "(NAME.chrN.FORMAT).",
+    )
+
+    group.add_argument(
+        "--nb-process", type=int, default=1, metavar="INT",
+        help="The number of processes to use for the per chromosome plots, "
+             "the tiles and the plots of the different p value (or LOD) "
+             "columns [Default: %(default)d].",
+    )
+
+    group.add_argument(
+        "--tiles", action="store_true",
+        help="Also create a multi-resolution tile pyramid "
+             "(NAME_tiles/Z/X/Y.png with a manifest.json file) for web "
+             "viewers.",
+    )
+
+    group.add_argument(
+        "--tile-max-zoom", type=int, default=5, metavar="INT",
+        help="The maximal zoom level of the tile pyramid "
+             "[Default: %(default)d].",
+    )
+
+    group.add_argument(
+        "--qq", action="store_true",
+        help="Also create a QQ plot of the two-point p values "
+             "(NAME.qq.FORMAT) with the genomic inflation factor, computed "
+             "while reading the input file.",
+    )
+
     # The graph type options
     group = parser.add_argument_group(
         "Graph Options",
@@ -781,6 +3902,46 @@ def parse_args():
              "coma) [Default: None].",
     )
 
+    # The minimal confidence value
+    group.add_argument(
+        "--min-conf", type=float, metavar="FLOAT",
+        help="Only plot the markers with a value (LOD or -log10(pvalue)) of "
+             "at least FLOAT. For Parquet and Arrow input files, the markers "
+             "are filtered while reading [Default: None].",
+    )
+
+    # The genome build
+    group.add_argument(
+        "--genome-build", type=str, metavar="BUILD",
+        help="The genome BUILD ({}) or a tab-separated file (chromosome "
+             "and length, without header) giving the length of the "
+             "chromosomes. The X axis then depends on the chromosome "
+             "lengths, and is the same for all the plots (the chromosomes "
+             "missing from the lengths, e.g. XY, are placed using their "
+             "markers) [Default: use the positions of the markers].".format(
+                 ", ".join(sorted(GENOME_BUILDS.keys())),
+             ),
+    )
+
+    # The order of the chromosomes
+    group.add_argument(
+        "--chr-order", type=str, default="natural", metavar="ORDER",
+        help="The plotting ORDER of the chromosomes and contigs: 'natural' "
+             "(the chromosomes, then the contigs sorted by name), 'input' "
+             "(the order of appearance in the input files) or a file with "
+             "one name per line (first, then the order of appearance) "
+             "[Default: %(default)s].",
+    )
+
+    # The small contigs
+    group.add_argument(
+        "--unplaced-below", type=float, metavar="LENGTH",
+        help="Merge the contigs (which are not chromosomes) shorter than "
+             "LENGTH (their maximal position, or their length with "
+             "--genome-build) in a single '{}' bin "
+             "[Default: None].".format(UNPLACED_LABEL),
+    )
+
     # The graph presentation options
     group = parser.add_argument_group(
         "Graph Presentation Options",
@@ -857,6 +4018,25 @@ def parse_args():
         help="The SIZE of each significant points [Default: %(default).1f].",
     )
 
+    # The renderer for the points
+    group.add_argument(
+        "--point-renderer", type=str, default="matplotlib",
+        choices=["matplotlib", "numpy", "density"],
+        help="The renderer for the points: 'numpy' splats the markers "
+             "directly in an image, which is much faster for millions of "
+             "markers, and 'density' draws the density of the "
+             "non-significant markers (2D histogram with cells of the size "
+             "of a point) [Default: %(default)s].",
+    )
+
+    # Decimating the points
+    group.add_argument(
+        "--decimate-points", action="store_true",
+        help="Only draw a single point per pixel of the output with the "
+             "'matplotlib' renderer (much faster for millions of markers, "
+             "but the points drawn over the others might change).",
+    )
+
     # The ablines positions
     group.add_argument(
         "--abline", type=str, default="3,-2", metavar="POS1,POS2,...",
@@ -877,6 +4057,15 @@ def parse_args():
         help="Do not draw annotation (SNP names) for the significant results.",
     )
 
+    # The gene annotation
+    group.add_argument(
+        "--genes", type=str, metavar="FILE",
+        help="A gene annotation FILE (GTF or BED, possibly compressed) used "
+             "to label the significant results with their overlapping (or "
+             "nearest) gene. The index of the genes is cached in "
+             "FILE.idx.npz.",
+    )
+
     # The size of the text
     group.add_argument(
         "--axis-text-size", type=int, default=12, metavar="INT",
@@ -929,7 +4118,7 @@ def parse_args():
              "[Default: %(default)s].",
     )
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def safe_main():
@@ -27,8 +27,9 @@ def setup_package():
             ],
         },
         py_modules=["manhattan_generator"],
-        install_requires=["matplotlib >=1.3.1", "numpy >= 1.8.0",
-                          "pandas >= 0.17.0"],
+        install_requires=["matplotlib >=1.3.1", "numpy >= 1.13.0",
+                          "pandas >= 0.20.0"],
+        extras_require={"columnar": ["pyarrow >= 1.0.0, < 15"]},
         classifiers=[
             "Operating System :: Linux",
             "Programming Language :: Python",
@@ -0,0 +1,162 @@
+"""Tests for manhattan_generator."""
+
+
+import gc
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import manhattan_generator
+
+# pyarrow is optional (a build incompatible with numpy raises an ImportError
+# which isn't a ModuleNotFoundError, so pytest.importorskip would fail)
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def write_markers(fn, nb_markers=300, seed=42):
+    """Writes random markers (with two p value columns) to a file."""
+    random = np.random.RandomState(seed)
+    data = pd.DataFrame({
+        "chr": np.repeat([1, 2, 3], nb_markers // 3),
+        "name": ["rs{}".format(i) for i in range(nb_markers)],
+        "pos": np.tile(np.arange(nb_markers // 3) * 100000 + 1, 3),
+        "p_value": random.uniform(1e-4, 1, nb_markers),
+        "p2": random.uniform(1e-12, 1, nb_markers),
+    })
+    data.loc[0, "p2"] = 1e-12
+    data.to_csv(fn, sep="\t", index=False)
+
+
+def get_args(argv):
+    """Parses and checks the options."""
+    args = manhattan_generator.parse_args(argv)
+    manhattan_generator.check_args(args)
+    return args
+
+
+def test_phenotypes_share_template(tmpdir, monkeypatch):
+    """Phenotypes with different maxima reuse a single figure template."""
+    i_fn = str(tmpdir.join("markers.txt"))
+    write_markers(i_fn)
+    prefix = str(tmpdir.join("plot"))
+    args = get_args(["--twopoint", i_fn, "--bp", "--use-pvalues",
+                     "--no-annotation", "--col-pvalue", "p_value,p2",
+                     "--dpi", "50", "-o", prefix])
+
+    # Counting the created figures
+    figures = []
+    new_figure = manhattan_generator.new_figure
+
+    def counting_new_figure(plt, figsize):
+        figures.append(figsize)
+        return new_figure(plt, figsize)
+
+    monkeypatch.setattr(manhattan_generator, "new_figure",
+                        counting_new_figure)
+    monkeypatch.setattr(manhattan_generator.FigureTemplate, "cache",
+                        manhattan_generator.OrderedDict())
+
+    twopoint, multipoint = manhattan_generator.read_input_files(args)
+    assert twopoint.p_value.max() != twopoint.p2.max()
+    manhattan_generator.create_phenotype_plots(twopoint, multipoint, args)
+
+    assert len(figures) == 1
+    assert len(manhattan_generator.FigureTemplate.cache) == 1
+    for column in ("p_value", "p2"):
+        assert tmpdir.join("plot.{}.png".format(column)).check()
+
+
+@pytest.mark.skipif(pyarrow is None, reason="pyarrow is not available")
+@pytest.mark.parametrize("extension", ["parquet", "feather"])
+def test_read_columnar_file(tmpdir, extension):
+    """Parquet and Arrow files give the same markers as text files."""
+    t_fn = str(tmpdir.join("markers.txt"))
+    write_markers(t_fn)
+    c_fn = str(tmpdir.join("markers." + extension))
+    data = pd.read_csv(t_fn, sep="\t")
+    if extension == "parquet":
+        data.to_parquet(c_fn)
+    else:
+        data.to_feather(c_fn)
+
+    expected = None
+    for i_fn in (t_fn, c_fn):
+        args = get_args(["--twopoint", i_fn, "--bp", "--use-pvalues",
+                         "--col-pvalue", "p_value,p2", "--exclude-chr", "2"])
+        twopoint, _ = manhattan_generator.read_input_files(args)
+        twopoint = twopoint.reset_index(drop=True)
+        if expected is None:
+            expected = twopoint
+        else:
+            pd.testing.assert_frame_equal(twopoint, expected,
+                                          check_dtype=False)
+    assert 2 not in set(expected.chrom)
+
+
+def test_input_file_closed_on_error(tmpdir):
+    """The input file is closed when a chunk can't be processed."""
+    i_fn = str(tmpdir.join("markers.txt"))
+    write_markers(i_fn)
+    args = get_args(["--twopoint", i_fn, "--bp", "--use-pvalues",
+                     "--col-pvalue", "missing"])
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        with pytest.raises(manhattan_generator.ProgramError):
+            manhattan_generator.read_input_files(args)
+        gc.collect()
+    assert not [w for w in caught if w.category is ResourceWarning]
+
+
+def test_qq_points_exact_tail():
+    """The tail of the QQ plot uses the exact largest values."""
+    random = np.random.RandomState(42)
+    values = -np.log10(random.uniform(1e-12, 1, 5000))
+    sketch = manhattan_generator.QuantileSketch(values[:2000])
+    sketch.merge(manhattan_generator.QuantileSketch(values[2000:]))
+
+    expected, observed = sketch.qq_points()
+    nb_top = manhattan_generator.QuantileSketch.nb_top
+    ranks = np.arange(1, nb_top + 1)
+    np.testing.assert_allclose(observed[:nb_top],
+                               np.sort(values)[::-1][:nb_top])
+    np.testing.assert_allclose(expected[:nb_top], -np.log10(ranks / 5001.0))
+    assert len(expected) == len(observed)
+
+
+def test_layout_chromosomes_missing_from_build():
+    """The chromosomes missing from the genome build use their markers."""
+    lengths = manhattan_generator.read_chrom_lengths(
+        "GRCh37", True, manhattan_generator.ContigNames(),
+    )
+    data = pd.DataFrame({"chrom": [1, 25, 25], "pos": [10, 60001, 2699520]})
+    manhattan_generator.check_chrom_lengths(
+        data, lengths, manhattan_generator.ContigNames(), "markers.txt",
+    )
+    layout = manhattan_generator.compute_chrom_layout(
+        data, None, 25000000, lengths, manhattan_generator.ContigNames(),
+    )
+    assert layout.max_pos[25] == 2699520
+    assert layout.max_pos[23] == lengths[23]
+    assert len(layout) == len(lengths) + 1
+
+
+def test_exclude_unknown_contig(tmpdir):
+    """A mistyped excluded contig raises an error."""
+    i_fn = str(tmpdir.join("markers.txt"))
+    pd.DataFrame({
+        "chr": ["scaffold_1", "scaffold_2"], "name": ["m1", "m2"],
+        "pos": [1000, 2000], "p_value": [0.5, 0.01],
+    }).to_csv(i_fn, sep="\t", index=False)
+
+    argv = ["--twopoint", i_fn, "--bp", "--use-pvalues", "--exclude-chr"]
+    twopoint, _ = manhattan_generator.read_input_files(
+        get_args(argv + ["scaffold_2"]),
+    )
+    assert list(twopoint.snp) == ["m1"]
+    with pytest.raises(manhattan_generator.ProgramError):
+        manhattan_generator.read_input_files(get_args(argv + ["scafold_2"]))